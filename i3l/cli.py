@@ -1,5 +1,18 @@
-from i3l.connect import connect
+from i3l.stats import StartupProfile
 
 
 def main():
-    connect()
+    profile = StartupProfile()
+    with profile.phase('imports'):
+        from i3l.connect import connect
+    connect(profile)
+
+
+def replay_main():
+    from i3l.trace import replay
+    replay()
+
+
+def msg_main():
+    from i3l.control import msg
+    msg()
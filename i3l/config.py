@@ -1,11 +1,15 @@
+import hashlib
 import logging
 import re
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from i3ipc import ConfigReply
 
 logger = logging.getLogger(__name__)
 
+VARIABLE = re.compile('set[\t ]+(\\$[^ \t]*)[\t ]+("?[^"]*"?)')
+WORKSPACE_LAYOUT = re.compile('([^ ]*) (.*) ?to workspace "?([^"]*)"?')
+
 
 class Variable:
     def __init__(self, name: str, value: str):
@@ -14,7 +18,9 @@ class Variable:
 
     @staticmethod
     def extract_var(command) -> Optional['Variable']:
-        match = re.match('set[\t ]+(\\$[^ \t]*)[\t ]+("?[^"]*"?)', command)
+        if not command.startswith('set'):
+            return None
+        match = VARIABLE.match(command)
         if match:
             try:
                 return Variable(match.group(1), match.group(2))
@@ -24,6 +30,8 @@ class Variable:
 
 
 class WorkspaceLayout:
+    _cache: Tuple[str, List['WorkspaceLayout']] = ('', [])
+
     def __init__(self, layout_name, layout_params, workspace_name):
         self.layout_name = layout_name
         self.layout_params = layout_params
@@ -31,26 +39,33 @@ class WorkspaceLayout:
 
     @classmethod
     def load(cls, i3_config: ConfigReply) -> List['WorkspaceLayout']:
-        i3_vars = {'$i3l': []}
+        config_hash = hashlib.sha1(i3_config.config.encode('utf-8')).hexdigest()
+        if cls._cache[0] == config_hash:
+            logger.debug('[config] i3 config unchanged, using the parsed workspace layouts')
+            return list(cls._cache[1])
+
+        i3_vars: Dict[str, str] = {}
+        i3l_values: List[str] = []
         for command in i3_config.config.split('\n'):
             var = Variable.extract_var(command)
             if var is not None and var.name != '$i3l':
                 i3_vars[var.name] = var.value
             elif var is not None:
-                i3_vars[var.name].append(var.value)
+                i3l_values.append(var.value)
 
-        i3l_options = [' '.join([i3_vars[token] if token.startswith('$') else token for token in i3l_option.split(' ')])
-                       for i3l_option in i3_vars['$i3l']]
         workspace_layouts = []
-        for i3l_option in i3l_options:
+        for i3l_value in i3l_values:
+            i3l_option = ' '.join([i3_vars.get(token, token) if token.startswith('$') else token
+                                   for token in i3l_value.split(' ')])
             workspace_layout = cls._create_workspace_layout(i3l_option)
             if workspace_layout is not None:
                 workspace_layouts.append(workspace_layout)
-        return workspace_layouts
+        cls._cache = (config_hash, workspace_layouts)
+        return list(workspace_layouts)
 
     @staticmethod
     def _create_workspace_layout(i3l_option) -> Optional['WorkspaceLayout']:
-        match = re.match('([^ ]*) (.*) ?to workspace "?([^"]*)"?', i3l_option)
+        match = WORKSPACE_LAYOUT.match(i3l_option)
         if match:
             try:
                 layout_name = match.group(1)
@@ -1,43 +1,186 @@
 import argparse
 import logging
+import signal
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
 
-from i3ipc import Connection, Event
+from i3ipc import Connection, Event, TickEvent
 
-from i3l.config import WorkspaceLayout
-from i3l.handlers import on_window_new, on_window_close, on_workspace_focus, on_window_move, on_tick, on_window_focus, \
-    on_window_floating
+from i3l.handlers import HANDLERS, Handler, on_control, subscriptions
+from i3l.mapper import WindowMapper
 from i3l.state import State
+from i3l.stats import StartupProfile, stats
 from i3l.layouts import Layouts
 
+if TYPE_CHECKING:
+    from i3l.control import ControlServer
+    from i3l.persistence import StateStore
 
-def connect():
+logger = logging.getLogger(__name__)
+
+
+def connect(profile: Optional[StartupProfile] = None):
     parser = argparse.ArgumentParser()
     parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--xdotool', action='store_true', help='use xdotool instead of python-xlib to redraw windows')
+    parser.add_argument('--reconcile-interval', type=float, default=30.0,
+                        help='maximum age in seconds of the cached i3 tree used on focus events')
+    parser.add_argument('--rebuild', choices=['in-place', 'remap'], default='remap',
+                        help='how windows are rearranged when a workspace needs to be rebuilt')
+    parser.add_argument('--rebuild-batch', type=int, default=1,
+                        help='number of windows mapped at once by the remap rebuild')
+    parser.add_argument('--coalesce-events', action='store_true',
+                        help='queue i3 events on an asyncio loop and collapse the bursts received while handling one; '
+                             'handlers still run one at a time')
+    parser.add_argument('--coalesce-ms', type=int, default=0,
+                        help='delay in milliseconds during which bursts of events are collapsed (implies --coalesce-events)')
+    parser.add_argument('--stats', action='store_true',
+                        help='collect latency and IPC statistics, reported by the stats command')
+    parser.add_argument('--record', metavar='FILE',
+                        help='append every event and i3 reply to a trace file (gzipped if it ends with .gz)')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='log the time spent importing, parsing the i3 config and syncing the initial state')
+    parser.add_argument('--state-file',
+                        help='file where layouts and windows order are saved to be restored on restart '
+                             '(default: $XDG_RUNTIME_DIR/i3-layouts/state.json)')
+    parser.add_argument('--no-state-file', action='store_true', help='do not save nor restore the state')
+    parser.add_argument('--control-socket',
+                        help='unix socket on which i3l commands are received '
+                             '(default: $XDG_RUNTIME_DIR/i3-layouts/control.sock)')
+    parser.add_argument('--no-control-socket', action='store_true', help='only receive i3l commands as i3 ticks')
     args = parser.parse_args()
     log_level = logging.DEBUG if args.debug else logging.INFO
 
     logging.basicConfig(stream=sys.stdout,
                         format='[%(asctime)s] %(levelname)s {%(filename)s:%(lineno)d} - %(message)s',
                         level=log_level)
-    i3 = Connection()
-
-    i3_config = i3.get_config()
-    workspace_layouts = WorkspaceLayout.load(i3_config)
-    layouts = Layouts([layout for layout in
-                       (Layouts.create(workspace_layout.layout_name,
-                                       workspace_layout.layout_params,
-                                       workspace_layout.workspace_name) for workspace_layout in workspace_layouts)
-                       if layout is not None])
-    state = State(i3)
-    i3.on(Event.WORKSPACE_FOCUS, on_workspace_focus(layouts, state))
-    i3.on(Event.WINDOW_NEW, on_window_new(layouts, state))
-    i3.on(Event.WINDOW_FOCUS, on_window_focus(layouts, state))
-    i3.on(Event.WINDOW_FLOATING, on_window_floating(layouts, state))
-    i3.on(Event.WINDOW_MOVE, on_window_move(layouts, state))
-    i3.on(Event.WINDOW_CLOSE, on_window_close(layouts, state))
-    i3.on(Event.TICK, on_tick(layouts, state))
+    stats.enabled = args.stats
+    profile = profile if profile is not None else StartupProfile()
+    profile.enabled = args.profile_startup
+    control = create_control_server(args)
+    recorder = None
+    if args.record:
+        from i3l.trace import RecordingConnection, TraceRecorder
+        recorder = TraceRecorder(args.record)
+        recorder.start(vars(args))
+    i3 = RecordingConnection(recorder, auto_reconnect=True) if recorder is not None else Connection(auto_reconnect=True)
+    store = create_state_store(args)
+    coalesce_events = args.coalesce_events or args.coalesce_ms > 0
+
+    def load_layouts() -> Layouts:
+        with profile.phase('config'):
+            return Layouts.load(i3.get_config())
+
+    def setup() -> List[Tuple[Event, Handler]]:
+        # the i3 config is parsed while the initial tree and workspaces are fetched
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='i3l-config') as executor:
+            layouts_future = executor.submit(load_layouts)
+            with profile.phase('state'):
+                state = State(i3, WindowMapper.create(args.xdotool), args.reconcile_interval,
+                              args.rebuild == 'in-place', args.rebuild_batch)
+            layouts = layouts_future.result()
+        handlers = subscriptions(layouts, state)
+        if store is not None:
+            with profile.phase('restore'):
+                store.restore(layouts, state)
+            handlers = [(event, store.wrap(layouts, state, handler)) for event, handler in handlers]
+        if recorder is not None:
+            handlers = [(event, recorder.wrap(event, handler)) for event, handler in handlers]
+        if control is not None:
+            control_handler = on_control(layouts, state)
+            if store is not None:
+                control_handler = store.wrap(layouts, state, control_handler)
+            if recorder is not None:
+                control_handler = recorder.wrap_control(control_handler)
+            control.handler = lambda request: control_handler(i3, request)
+            # the event queue already runs control requests and events on its single worker thread
+            handlers = handlers if coalesce_events else [(event, control.wrap(handler)) for event, handler in handlers]
+        profile.report()
+        return handlers
+
+    # i3-layouts is usually stopped with SIGTERM: exit through the finally clause to save the state and close the trace
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        run(i3, setup, control, args.coalesce_ms / 1000 if coalesce_events else None)
+    finally:
+        if control is not None:
+            control.close()
+        if store is not None:
+            store.flush()
+        if recorder is not None:
+            recorder.close()
+
+
+# the optional subsystems are only imported when enabled
+def create_state_store(args: argparse.Namespace) -> Optional['StateStore']:
+    if args.no_state_file:
+        return None
+    from i3l.persistence import StateStore, default_state_path
+    state_file = args.state_file if args.state_file is not None else default_state_path()
+    return StateStore(state_file) if state_file is not None else None
+
+
+def create_control_server(args: argparse.Namespace) -> Optional['ControlServer']:
+    if args.no_control_socket:
+        return None
+    from i3l.control import ControlServer, default_control_path
+    control_socket = args.control_socket if args.control_socket is not None else default_control_path()
+    if control_socket is None:
+        return None
+    control = ControlServer(control_socket)
+    if control.in_use():
+        # exec_always starts i3-layouts again on every i3 restart, while the running one reconnects on its own
+        logger.error(f'[connect] i3-layouts is already running, listening on {control_socket}')
+        sys.exit(1)
+    return control
+
+
+def run(i3: Connection, setup: Callable[[], List[Tuple[Event, Handler]]], control: Optional['ControlServer'],
+        coalesce_delay: Optional[float]):
+    if coalesce_delay is not None:
+        from i3l.dispatcher import EventDispatcher
+        dispatcher = EventDispatcher(i3, coalesce_delay, control)
+        dispatcher.subscribe([event for event, _ in HANDLERS])
+        dispatcher.run(setup)
+    else:
+        run_sync(i3, setup, control)
+
+
+def run_sync(i3: Connection, setup: Callable[[], List[Tuple[Event, Handler]]], control: Optional['ControlServer']):
+    # events are subscribed before the setup: i3 confirms the subscription with a first tick event, which starts the
+    # setup on another thread, and the events received meanwhile wait in the i3 socket until it is done
+    handlers: Dict[Event, Handler] = {}
+    ready = threading.Event()
+    started = threading.Event()
+
+    def _setup():
+        try:
+            handlers.update(setup())
+            if control is not None:
+                control.start()
+        except Exception:
+            logger.exception('[connect] startup failed')
+            i3.main_quit()
+        finally:
+            ready.set()
+
+    def _deferred(event: Event) -> Handler:
+
+        def _handler(i3l: Connection, e):
+            if isinstance(e, TickEvent) and e.first and not started.is_set():
+                started.set()
+                threading.Thread(target=_setup, name='i3l-setup', daemon=True).start()
+                return
+            ready.wait()
+            if event in handlers:
+                handlers[event](i3l, e)
+
+        return _handler
 
+    for event, _ in HANDLERS:
+        i3.on(event, _deferred(event))
     i3.main()
 
 
@@ -0,0 +1,143 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import asyncio
+
+from i3l.runtime import runtime_dir
+
+logger = logging.getLogger(__name__)
+
+ControlHandler = Callable[[str], Dict[str, Any]]
+
+
+def default_control_path() -> Optional[str]:
+    directory = runtime_dir()
+    return os.path.join(directory, 'control.sock') if directory is not None else None
+
+
+class ControlServer:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.handler: Optional[ControlHandler] = None
+        self.lock = threading.Lock()
+        self._socket: Optional[socket.socket] = None
+
+    def wrap(self, handler: Callable[[Any, Any], None]) -> Callable[[Any, Any], None]:
+
+        def _locked(i3l: Any, e: Any):
+            with self.lock:
+                handler(i3l, e)
+
+        return _locked
+
+    def in_use(self) -> bool:
+        # a socket accepting connections belongs to another i3-layouts, a stale one is replaced on start
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(self.path)
+            return True
+        except OSError:
+            return False
+
+    def start(self):
+        self._prepare_path()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self._socket.listen()
+        threading.Thread(target=self._accept, name='i3l-control', daemon=True).start()
+        logger.info(f'[control] listening on {self.path}')
+
+    async def serve(self, executor: Executor) -> 'asyncio.AbstractServer':
+        import asyncio
+
+        async def _on_client(reader: 'asyncio.StreamReader', writer: 'asyncio.StreamWriter'):
+            loop = asyncio.get_event_loop()
+            try:
+                request = await reader.readline()
+                while request:
+                    reply = await loop.run_in_executor(executor, self.handle, request.decode('utf-8').strip())
+                    writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+                    await writer.drain()
+                    request = await reader.readline()
+            finally:
+                writer.close()
+
+        self._prepare_path()
+        server = await asyncio.start_unix_server(_on_client, self.path)
+        os.chmod(self.path, 0o600)
+        logger.info(f'[control] listening on {self.path}')
+        return server
+
+    def handle(self, request: str) -> Dict[str, Any]:
+        logger.debug(f'[control] request: {request}')
+        if self.handler is None:
+            return {'success': False, 'error': 'i3-layouts is starting'}
+        try:
+            return self.handler(request)
+        except Exception as e:
+            logger.exception(f'[control] request failed: {request}')
+            return {'success': False, 'error': str(e)}
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _prepare_path(self):
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self._socket.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client: socket.socket):
+        with client, client.makefile('rwb') as stream:
+            for request in stream:
+                with self.lock:
+                    reply = self.handle(request.decode('utf-8').strip())
+                stream.write(json.dumps(reply).encode('utf-8') + b'\n')
+                stream.flush()
+
+
+def send(request: str, path: Optional[str] = None) -> Dict[str, Any]:
+    path = path or default_control_path()
+    if path is None:
+        raise FileNotFoundError('no control socket')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        with client.makefile('rwb') as stream:
+            stream.write(request.encode('utf-8') + b'\n')
+            stream.flush()
+            return json.loads(stream.readline())
+
+
+def msg():
+    parser = argparse.ArgumentParser(description='send commands to i3-layouts through its control socket')
+    parser.add_argument('--socket', default=default_control_path())
+    parser.add_argument('command', nargs='+')
+    args = parser.parse_args()
+    request = ' '.join(args.command)
+    try:
+        reply = send(request, args.socket)
+    except OSError:
+        from i3ipc import Connection
+        reply = {'success': Connection().send_tick(f'i3-layouts {request}').success, 'tick': True}
+    print(json.dumps(reply))
+    sys.exit(0 if reply.get('success') else 1)
@@ -1,41 +1,38 @@
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from i3ipc import Con
 
+Point = Tuple[int, int]
+
 
 class Corners:
     def __init__(self, containers: List[Con]):
         self._containers = containers
-        self.xs = list(dict.fromkeys([container.rect.x for container in self._containers]))
-        self.xs.sort()
-        self.ys = list(dict.fromkeys([container.rect.y for container in self._containers]))
-        self.ys.sort()
+        self.xs = sorted(set(container.rect.x for container in self._containers))
+        self.ys = sorted(set(container.rect.y for container in self._containers))
         self.left = self.xs[0]
         self.top = self.ys[0]
         self.right = max([container.rect.x + container.rect.width for container in self._containers])
         self.bottom = max([container.rect.y + container.rect.height for container in self._containers])
+        self._top_lefts: Dict[Point, Con] = {}
+        self._bottom_lefts: Dict[Point, Con] = {}
+        self._bottom_rights: Dict[Point, Con] = {}
+        self._top_rights: Dict[Point, Con] = {}
+        for container in self._containers:
+            rect = container.rect
+            self._top_lefts.setdefault((rect.x, rect.y), container)
+            self._bottom_lefts.setdefault((rect.x, rect.y + rect.height), container)
+            self._bottom_rights.setdefault((rect.x + rect.width, rect.y + rect.height), container)
+            self._top_rights.setdefault((rect.x + rect.width, rect.y), container)
 
     def top_left(self) -> Optional[Con]:
-        for container in self._containers:
-            if container.rect.x == self.left and container.rect.y == self.top:
-                return container
-        return None
+        return self._top_lefts.get((self.left, self.top))
 
     def bottom_left(self) -> Optional[Con]:
-        for container in self._containers:
-            if container.rect.x == self.left and container.rect.y + container.rect.height == self.bottom:
-                return container
-        return None
+        return self._bottom_lefts.get((self.left, self.bottom))
 
     def bottom_right(self) -> Optional[Con]:
-        for container in self._containers:
-            if container.rect.x + container.rect.width == self.right and \
-                    container.rect.y + container.rect.height == self.bottom:
-                return container
-        return None
+        return self._bottom_rights.get((self.right, self.bottom))
 
     def top_right(self) -> Optional[Con]:
-        for container in self._containers:
-            if container.rect.x + container.rect.width == self.right and container.rect.y == self.top:
-                return container
-        return None
+        return self._top_rights.get((self.right, self.top))
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from i3ipc import Connection, Event
+from i3ipc.events import WindowEvent
+from i3ipc.aio import Connection as AioConnection
+
+from i3l.control import ControlServer
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Connection, Any], None]
+Setup = Callable[[], List[Tuple[Event, Handler]]]
+
+
+class EventDispatcher:
+
+    def __init__(self, i3: Connection, coalesce_delay: float = 0.0, control: Optional[ControlServer] = None):
+        self._i3 = i3
+        self._coalesce_delay = coalesce_delay
+        self._control = control
+        self._events: List[Event] = []
+        self._handlers: Dict[Event, Handler] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='i3l-handlers')
+
+    def on(self, event: Event, handler: Handler):
+        self.subscribe([event])
+        self._handlers[event] = handler
+
+    def subscribe(self, events: List[Event]):
+        self._events.extend(event for event in events if event not in self._events)
+
+    def run(self, setup: Optional[Setup] = None):
+        asyncio.run(self.main(setup))
+
+    async def main(self, setup: Optional[Setup] = None):
+        # events are subscribed first and buffered until the setup (config, initial state) is done
+        self._queue = asyncio.Queue()
+        i3l = await AioConnection(auto_reconnect=True).connect()
+        for event in self._events:
+            i3l.on(event, self._enqueue(event))
+        worker = asyncio.ensure_future(self._work(i3l, setup))
+        control_server = await self._control.serve(self._executor) if self._control is not None else None
+        try:
+            await i3l.main()
+        finally:
+            if control_server is not None:
+                control_server.close()
+            worker.cancel()
+            self._executor.shutdown(wait=False)
+
+    def _enqueue(self, event: Event) -> Callable[[AioConnection, Any], None]:
+
+        def _on_event(_: AioConnection, e: Any):
+            self._queue.put_nowait((event, e))
+
+        return _on_event
+
+    async def _work(self, i3l: AioConnection, setup: Optional[Setup]):
+        if setup is not None and not await self._setup(i3l, setup):
+            return
+        while True:
+            events = [await self._queue.get()]
+            if self._coalesce_delay > 0:
+                await asyncio.sleep(self._coalesce_delay)
+            while not self._queue.empty():
+                events.append(self._queue.get_nowait())
+            coalesced_events = self.coalesce(events)
+            if len(coalesced_events) < len(events):
+                logger.debug(f'[dispatcher] {len(events)} events coalesced into {len(coalesced_events)}')
+            for event, e in coalesced_events:
+                await self._dispatch(event, e)
+            for _ in events:
+                self._queue.task_done()
+
+    async def _dispatch(self, event: Event, e: Any):
+        if event not in self._handlers:
+            return
+        try:
+            await asyncio.get_event_loop().run_in_executor(self._executor, self._handlers[event], self._i3, e)
+        except Exception:
+            logger.exception(f'[dispatcher] handler failed for {type(e).__name__}')
+
+    async def _setup(self, i3l: AioConnection, setup: Setup) -> bool:
+        try:
+            subscriptions = await asyncio.get_event_loop().run_in_executor(self._executor, setup)
+        except Exception:
+            logger.exception('[dispatcher] startup failed')
+            i3l.main_quit()
+            return False
+        for event, handler in subscriptions:
+            self._handlers[event] = handler
+        logger.debug(f'[dispatcher] {self._queue.qsize()} events received during startup')
+        return True
+
+    @staticmethod
+    def coalesce(events: List[Tuple[Event, Any]]) -> List[Tuple[Event, Any]]:
+        # only the last focus event matters, unless its container is closed within the same burst
+        closed_ids = {e.container.id for _, e in events if isinstance(e, WindowEvent) and e.change == 'close'}
+        last_focus_index = max((index for index, (_, e) in enumerate(events)
+                                if isinstance(e, WindowEvent) and e.change == 'focus'), default=None)
+        coalesced_events = []
+        for index, (event, e) in enumerate(events):
+            if isinstance(e, WindowEvent) and e.change == 'focus' and \
+                    (index != last_focus_index or e.container.id in closed_ids):
+                continue
+            coalesced_events.append((event, e))
+        return coalesced_events
@@ -0,0 +1,170 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from i3ipc import Con
+
+from i3l.options import Direction
+from i3l.state import Context, is_layout_container
+
+logger = logging.getLogger(__name__)
+
+Rectangle = Tuple[int, int, int, int]
+
+
+class Node:
+    def __init__(self, percent: float = 1.0, con_id: Optional[int] = None):
+        self.percent = percent
+        self.con_id = con_id
+        self.outer_id: Optional[int] = None
+
+    def is_leaf(self) -> bool:
+        return False
+
+    def leaves(self) -> List[int]:
+        pass
+
+    def rects(self, x: int, y: int, width: int, height: int) -> Dict[int, Rectangle]:
+        pass
+
+
+class Leaf(Node):
+    def __init__(self, con_id: int, percent: float = 1.0):
+        super().__init__(percent, con_id)
+
+    def is_leaf(self) -> bool:
+        return True
+
+    def leaves(self) -> List[int]:
+        return [self.con_id]
+
+    def rects(self, x: int, y: int, width: int, height: int) -> Dict[int, Rectangle]:
+        return {self.con_id: (x, y, width, height)}
+
+
+class Split(Node):
+    def __init__(self, orientation: Direction, children: List[Node], percent: float = 1.0, con_id: Optional[int] = None):
+        super().__init__(percent, con_id)
+        self.orientation = orientation
+        self.children = children
+
+    def leaves(self) -> List[int]:
+        return [con_id for child in self.children for con_id in child.leaves()]
+
+    def rects(self, x: int, y: int, width: int, height: int) -> Dict[int, Rectangle]:
+        rects = {}
+        size = width if self.orientation == Direction.HORIZONTAL else height
+        offset = 0
+        for index, child in enumerate(self.children):
+            child_size = size - offset if index == len(self.children) - 1 else round(size * child.percent)
+            if self.orientation == Direction.HORIZONTAL:
+                rects.update(child.rects(x + offset, y, child_size, height))
+            else:
+                rects.update(child.rects(x, y + offset, width, child_size))
+            offset += child_size
+        return rects
+
+    @staticmethod
+    def of(orientation: Direction, children: List[Node], percent: float = 1.0) -> Node:
+        if len(children) == 1:
+            children[0].percent = percent
+            return children[0]
+        return Split(orientation, children, percent)
+
+    @staticmethod
+    def even(orientation: Direction, con_ids: List[int], percent: float = 1.0) -> Node:
+        return Split.of(orientation, [Leaf(con_id, 1 / len(con_ids)) for con_id in con_ids], percent)
+
+
+class GeometryBuilder:
+    # the target tree is built top down from its first leaf, alone on its workspace: the first leaf of each child
+    # is moved next to the one of its previous sibling, after splitting the first one in the orientation of their parent
+
+    def __init__(self, anchor_mark: str):
+        self._anchor_mark = anchor_mark
+
+    def commands(self, target: Node) -> List[str]:
+        if target.is_leaf():
+            return []
+        first_ids = [child.leaves()[0] for child in target.children]
+        commands = [f'[con_id="{first_ids[0]}"] split {target.orientation.value}']
+        for previous_id, con_id in zip(first_ids, first_ids[1:]):
+            commands.append(f'[con_id="{previous_id}"] mark --add {self._anchor_mark}')
+            commands.append(f'[con_id="{con_id}"] move window to mark {self._anchor_mark}')
+        for child in target.children:
+            commands.extend(self.commands(child))
+        return commands
+
+
+class GeometryApplier:
+
+    def __init__(self, context: Context):
+        self._context = context
+        self._commands: List[str] = []
+
+    def apply(self, target: Optional[Node], main_mark: str, last_mark: str) -> bool:
+        if target is None:
+            return False
+        current = self.current_node(self._context.workspace)
+        if current is None or sorted(current.leaves()) != sorted(target.leaves()):
+            return False
+        self._commands = []
+        if not self._match(current, target):
+            logger.debug('[geometry] workspace tree does not match the target shape')
+            return False
+        self._swap_leaves(current.leaves(), target.leaves())
+        for command in self._commands:
+            self._context.exec(command)
+        con_ids = target.leaves()
+        self._context.exec(f'[con_id="{con_ids[0]}"] mark --add {main_mark}')
+        self._context.exec(f'[con_id="{con_ids[-1]}"] mark --add {last_mark}')
+        logger.debug(f'[geometry] workspace rearranged with {len(self._commands) + 2} commands')
+        return True
+
+    def _match(self, current: Node, target: Node) -> bool:
+        if current.is_leaf() or target.is_leaf():
+            return current.is_leaf() and target.is_leaf()
+        if len(current.children) != len(target.children):
+            return False
+        if current.orientation != target.orientation:
+            con_id = self._position_id(current.children[0], target.children[0])
+            self._commands.append(f'[con_id="{con_id}"] layout split{target.orientation.value[0]}')
+        size = 'width' if target.orientation == Direction.HORIZONTAL else 'height'
+        for current_child, target_child in list(zip(current.children, target.children))[:-1]:
+            if abs(current_child.percent - target_child.percent) > 0.01:
+                con_id = self._position_id(current_child, target_child)
+                self._commands.append(f'[con_id="{con_id}"] resize set {size} {round(target_child.percent * 100)} ppt')
+        return all(self._match(current_child, target_child)
+                   for current_child, target_child in zip(current.children, target.children))
+
+    @staticmethod
+    def _position_id(current: Node, target: Node) -> int:
+        # leaves are swapped before any other command: the target leaf then sits at this position
+        if current.outer_id is not None:
+            return current.outer_id
+        return target.con_id if target.is_leaf() else current.con_id
+
+    def _swap_leaves(self, current_ids: List[int], target_ids: List[int]):
+        swaps = []
+        for index, con_id in enumerate(target_ids):
+            if current_ids[index] != con_id:
+                other_index = current_ids.index(con_id)
+                swaps.append(f'[con_id="{current_ids[index]}"] swap container with con_id {con_id}')
+                current_ids[index], current_ids[other_index] = current_ids[other_index], current_ids[index]
+        self._commands = swaps + self._commands
+
+    @classmethod
+    def current_node(cls, con: Con) -> Optional[Node]:
+        children = [child for child in con.nodes if len(child.nodes) > 0 or is_layout_container(child)]
+        if len(children) == 0:
+            return Leaf(con.id, con.percent or 1.0) if is_layout_container(con) else None
+        if len(children) == 1 and len(con.nodes) == 1:
+            node = cls.current_node(children[0])
+            if node is not None and con.type != 'workspace':
+                node.percent = con.percent or 1.0
+                node.outer_id = con.id
+            return node
+        orientation = {'splith': Direction.HORIZONTAL, 'splitv': Direction.VERTICAL}.get(con.layout)
+        nodes = [cls.current_node(child) for child in children]
+        if orientation is None or len(children) != len(con.nodes) or None in nodes:
+            return None
+        return Split(orientation, nodes, con.percent or 1.0, con.id)
@@ -1,33 +1,107 @@
-from i3ipc import Connection, TickEvent
-from i3ipc.events import WorkspaceEvent, WindowEvent
+import re
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, List, Tuple
+
+from i3ipc import Connection, Event, TickEvent
+from i3ipc.events import BindingEvent, ShutdownEvent, WorkspaceEvent, WindowEvent
 import logging
 
 from i3l.options import LayoutName
-from i3l.splitter import Mark
-from i3l.state import State, RebuildCause, is_layout_container, is_floating_container
+from i3l.state import Context, State, RebuildCause, is_layout_container, is_floating_container
 from i3l.layouts import Layouts
-from i3l.ticks import Tick
+from i3l.stats import stats
+from i3l.ticks import LayoutTick, Tick
 
 logger = logging.getLogger(__name__)
 
+Handler = Callable[[Connection, Any], None]
+
+# commands changing the containers rects without i3 sending any window event
+RESIZING_COMMAND = re.compile(r'(?:^|[;,\]])\s*(?:resize|layout|border|gaps)\b')
+
+
+def timed(event_name: str) -> Callable[[Callable[[Layouts, State], Handler]], Callable[[Layouts, State], Handler]]:
+
+    def _timed(factory: Callable[[Layouts, State], Handler]) -> Callable[[Layouts, State], Handler]:
+
+        @wraps(factory)
+        def _factory(layouts: Layouts, state: State) -> Handler:
+            handler = factory(layouts, state)
+
+            def _layout_name() -> str:
+                layout = layouts.get(state.prev_workspace_name)
+                return layout.name.value if layout is not None else 'none'
+
+            def _handler(i3l: Connection, e: Any):
+                if not stats.enabled:
+                    return handler(i3l, e)
+                with stats.event(event_name, _layout_name):
+                    return handler(i3l, e)
+
+            return _handler
+
+        return _factory
+
+    return _timed
+
+
+def parse_actions(payload: str) -> List[List[str]]:
+    return [action.split() for action in payload.split(';') if action.strip() != '']
+
+
+def run_actions(layouts: Layouts, state: State, i3l: Connection, actions: List[List[str]]) -> Context:
+    context = state.sync_context(i3l)
+    with context.batch():
+        for index, tokens in enumerate(actions):
+            tick = Tick.create(layouts, state, tokens[0])
+            if tick is None:
+                continue
+            if index > 0 and not state.tree_cache.is_valid():
+                logger.debug('  [ipc] tick event - tree changed by the previous action, resyncing')
+                context.resync(state.workspace_sequences)
+            tick.do(context, tokens[1:])
+    return context
+
 
+@timed('tick')
 def on_tick(layouts: Layouts, state: State):
 
     def _on_tick(i3l: Connection, e: TickEvent):
         logger.debug(f'[ipc] tick event - payload:{e.payload}')
+        # i3 sends a first tick when the events are subscribed again after a restart
+        if e.first and state.restarting:
+            state.restart(i3l)
+            reload_layouts(layouts, state, i3l)
+            return
         if not e.payload.startswith('i3-layouts'):
             return
-        context = state.sync_context(i3l)
-        tokens = e.payload.split(' ')
-        action_name = tokens[1]
-        action_params = tokens[2:]
-        tick = Tick.create(layouts, state, action_name)
-        if tick is not None:
-            tick.do(context, action_params)
+        run_actions(layouts, state, i3l, parse_actions(e.payload[len('i3-layouts'):]))
 
     return _on_tick
 
 
+@timed('control')
+def on_control(layouts: Layouts, state: State):
+
+    def _on_control(i3l: Connection, request: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+        actions = parse_actions(request)
+        unknown_actions = [tokens[0] for tokens in actions if not Tick.exists(tokens[0])]
+        if len(actions) == 0 or len(unknown_actions) > 0:
+            logger.debug(f'[ipc] control request - unknown actions: {unknown_actions}')
+            return {'success': False, 'error': f'unknown action: {" ".join(unknown_actions)}'
+                    if len(unknown_actions) > 0 else 'no action'}
+        context = run_actions(layouts, state, i3l, actions)
+        layout = layouts.get(context.workspace.name)
+        return {'success': True, 'workspace': context.workspace.name,
+                'layout': layout.name.value if layout is not None else None,
+                'time_ms': round((time.perf_counter() - start) * 1000, 3)}
+
+    return _on_control
+
+
+@timed('workspace_focus')
 def on_workspace_focus(layouts: Layouts, state: State):
 
     def _on_workspace_focus(i3l: Connection, e: WorkspaceEvent):
@@ -39,8 +113,8 @@ def on_workspace_focus(layouts: Layouts, state: State):
             if state.prev_workspace_name != e.current.name and sequence.is_stale:
                 layout = layouts.get(context.workspace.name)
                 con_id = sequence.stale_con_id
-                state.start_rebuild(RebuildCause.WORKSPACE_FOCUS, context,
-                                    layout.mark_main(), layout.mark_last(), con_id)
+                with context.batch():
+                    state.start_rebuild(RebuildCause.WORKSPACE_FOCUS, context, layout, con_id)
                 sequence.set_stale(False)
             elif state.prev_workspace_name != e.current.name:
                 state.end_rebuild(context, RebuildCause.WORKSPACE_FOCUS)
@@ -49,6 +123,7 @@ def on_workspace_focus(layouts: Layouts, state: State):
             state.end_rebuild(context, RebuildCause.WORKSPACE_FOCUS)
 
         state.prev_workspace_name = e.current.name
+        state.workspace_names[e.current.id] = e.current.name
         if e.old:
             state.old_workspace_name = e.old.name
             if layouts.exists_for(e.old.name):
@@ -57,6 +132,80 @@ def on_workspace_focus(layouts: Layouts, state: State):
     return _on_workspace_focus
 
 
+@timed('workspace_empty')
+def on_workspace_empty(layouts: Layouts, state: State):
+
+    def _on_workspace_empty(i3l: Connection, e: WorkspaceEvent):
+        logger.debug(f'[ipc] workspace empty event - workspace:{e.current.name}')
+        state.remove_workspace(e.current.id, e.current.name)
+        layouts.reset(e.current.name)
+
+    return _on_workspace_empty
+
+
+@timed('workspace_rename')
+def on_workspace_rename(layouts: Layouts, state: State):
+
+    def _on_workspace_rename(i3l: Connection, e: WorkspaceEvent):
+        logger.debug(f'[ipc] workspace rename event - workspace:{e.current.name}')
+        old_workspace_name = state.rename_workspace(e.current.id, e.current.name)
+        if old_workspace_name is None:
+            return
+        old_layout = layouts.get(old_workspace_name)
+        layout = layouts.rename(old_workspace_name, e.current.name)
+        if layout is None:
+            return
+        context = state.sync_context(i3l)
+        with context.batch():
+            for old_mark, mark in [(old_layout.mark_main(), layout.mark_main()),
+                                   (old_layout.mark_last(), layout.mark_last())]:
+                for con_id in context.tree.find_marked_ids(old_mark):
+                    context.mark(con_id, mark)
+
+    return _on_workspace_rename
+
+
+@timed('workspace_reload')
+def on_workspace_reload(layouts: Layouts, state: State):
+
+    def _on_workspace_reload(i3l: Connection, e: WorkspaceEvent):
+        logger.debug('[ipc] workspace reload event')
+        reload_layouts(layouts, state, i3l)
+
+    return _on_workspace_reload
+
+
+def reload_layouts(layouts: Layouts, state: State, i3l: Connection):
+    changed_workspace_names = layouts.reload(Layouts.load(i3l.get_config()))
+    if len(changed_workspace_names) == 0:
+        logger.debug('  [ipc] reload - workspace layouts unchanged')
+        return
+    context = state.sync_context(i3l)
+    for workspace_name in changed_workspace_names:
+        layout = layouts.get(workspace_name)
+        logger.debug(f'  [ipc] reload - workspace {workspace_name} layout changed '
+                     f'to {layout.name.value if layout is not None else "none"}')
+        if layout is None:
+            continue
+        if workspace_name == context.workspace.name:
+            with context.batch():
+                LayoutTick(layouts, state, layout.name.value).apply(context, layout)
+        elif state.get_workspace_sequence(workspace_name) is not None:
+            state.get_workspace_sequence(workspace_name).set_stale(True)
+
+
+@timed('shutdown')
+def on_shutdown(layouts: Layouts, state: State):
+
+    def _on_shutdown(i3l: Connection, e: ShutdownEvent):
+        logger.debug(f'[ipc] shutdown event - change:{e.change}')
+        # the containers ids are only dropped once i3 is back, see on_tick
+        state.restarting = True
+
+    return _on_shutdown
+
+
+@timed('window_close')
 def on_window_close(layouts: Layouts, state: State):
 
     def _on_window_close(i3l: Connection, e: WindowEvent):
@@ -64,20 +213,23 @@ def on_window_close(layouts: Layouts, state: State):
         context = state.sync_context(i3l)
         if not layouts.exists_for(context.workspace.name):
             logger.debug('  [ipc] window close event - no workspace layout')
-            return
-        if not state.rebuild_closed_container(e.container.window):
+        elif not state.rebuild_closed_container(e.container.window):
             layout = layouts.get(context.workspace.name)
-            state.start_rebuild(RebuildCause.WINDOW_CLOSE, context,
-                                layout.mark_main(), layout.mark_last(), e.container.id)
+            with context.batch():
+                state.start_rebuild(RebuildCause.WINDOW_CLOSE, context, layout, e.container.id)
+        state.remove_container(e.container.id, e.container.window)
 
     return _on_window_close
 
 
+@timed('window_move')
 def on_window_move(layouts: Layouts, state: State):
 
     def _on_window_move(i3l: Connection, e: WindowEvent):
         logger.debug(f'[ipc] window move event - container:{e.container.id}')
         context = state.sync_context(i3l)
+        state.invalidate_adjacency_graph(context.workspace.name)
+        state.invalidate_adjacency_graph(state.old_workspace_name)
         if context.contains_container(e.container.id) or e.container.type != 'con':
             logger.debug('  [ipc] window move event - inside workspace')
             return
@@ -88,17 +240,19 @@ def on_window_move(layouts: Layouts, state: State):
             sequence.set_stale(True, e.container.id)
         if layouts.exists_for(context.workspace.name):
             layout = layouts.get(context.workspace.name)
-            state.start_rebuild(RebuildCause.WINDOW_MOVE, context,
-                                layout.mark_main(), layout.mark_last(), e.container.id)
+            with context.batch():
+                state.start_rebuild(RebuildCause.WINDOW_MOVE, context, layout, e.container.id)
 
     return _on_window_move
 
 
+@timed('window_new')
 def on_window_new(layouts: Layouts, state: State):
 
     def _on_window_new(i3l: Connection, e: WindowEvent):
         logger.debug(f'[ipc] window new event - container:{e.container.id}:{e.container.window}')
         context = state.sync_context(i3l)
+        context.exclude_windows(state.pending_windows(e.container))
         if not layouts.exists_for(context.workspace.name) or context.workspace_sequence is None:
             logger.debug('  [ipc] window new event - no workspace layout')
             return
@@ -109,16 +263,18 @@ def on_window_new(layouts: Layouts, state: State):
             logger.debug('  [ipc] window new event - no container to handle')
             return
         context.workspace_sequence.set_order(e.container)
+        state.invalidate_adjacency_graph(context.workspace.name)
 
         logger.debug('  [ipc] window new event - update layout')
         layout = layouts.get(context.workspace.name)
-        layout.update(context, e.container)
-
-        state.handle_rebuild(context, e.container)
+        with context.batch():
+            layout.update(context, e.container)
+            state.handle_rebuild(context, e.container)
 
     return _on_window_new
 
 
+@timed('window_floating')
 def on_window_floating(layouts: Layouts, state: State):
 
     def _on_window_floating(i3l: Connection, e: WindowEvent):
@@ -128,7 +284,7 @@ def on_window_floating(layouts: Layouts, state: State):
                 state.rebuild_action.container_id_to_focus = e.container.id
                 on_window_close(layouts, state)(i3l, e)
             else:
-                state.rebuild_action.last_container_rebuilt = None
+                state.rebuild_action.floating_disabled.add(e.container.window)
                 context = state.sync_context(i3l)
                 context.exec(f'[con_id={e.container.id}] floating disable')
         else:
@@ -137,20 +293,22 @@ def on_window_floating(layouts: Layouts, state: State):
     return _on_window_floating
 
 
+@timed('window_focus')
 def on_window_focus(layouts: Layouts, state: State):
 
     def _on_window_focus(i3l: Connection, e: WindowEvent):
         logger.debug(f'[ipc] window focus event - container:{e.container.id}:{e.container.window}')
-        context = state.sync_context(i3l)
-        layout = layouts.get(context.workspace.name)
-        focused_container = i3l.get_tree().find_focused()
-        if not is_layout_container(focused_container):
+        if not is_layout_container(e.container):
             logger.debug('  [ipc] window focus event - not a layout container')
             return
-        previous_mark = Mark.previous()
-        current_mark = Mark.current()
-        i3l.command(f'[con_mark="{current_mark}"] mark --add {previous_mark}')
-        i3l.command(f'[con_id="{focused_container.id}"] mark --add {current_mark}')
+        if not state.focus_history.focus(e.container.id):
+            logger.debug('  [ipc] window focus event - focus unchanged')
+            return
+        if not layouts.uses(LayoutName.AUTOSPLIT):
+            logger.debug('  [ipc] window focus event - no autosplit layout')
+            return
+        context = state.sync_focus_context(i3l, e.container)
+        layout = layouts.get(context.workspace.name)
         if layout is None:
             logger.debug('  [ipc] window focus event - no workspace layout')
             return
@@ -159,6 +317,36 @@ def on_window_focus(layouts: Layouts, state: State):
             return
 
         logger.debug('  [ipc] window focus event - update layout')
-        layout.update(context, focused_container)
+        with context.batch():
+            layout.update(context, context.focused)
 
     return _on_window_focus
+
+
+@timed('binding')
+def on_binding(layouts: Layouts, state: State):
+
+    def _on_binding(i3l: Connection, e: BindingEvent):
+        if RESIZING_COMMAND.search(e.binding.command) is not None:
+            logger.debug(f'[ipc] binding event - tree cache invalidated by {e.binding.command}')
+            state.tree_cache.invalidate()
+
+    return _on_binding
+
+
+HANDLERS = [(Event.WORKSPACE_FOCUS, on_workspace_focus),
+            (Event.WORKSPACE_EMPTY, on_workspace_empty),
+            (Event.WORKSPACE_RENAME, on_workspace_rename),
+            (Event.WORKSPACE_RELOAD, on_workspace_reload),
+            (Event.WINDOW_NEW, on_window_new),
+            (Event.WINDOW_FOCUS, on_window_focus),
+            (Event.WINDOW_FLOATING, on_window_floating),
+            (Event.WINDOW_MOVE, on_window_move),
+            (Event.WINDOW_CLOSE, on_window_close),
+            (Event.BINDING, on_binding),
+            (Event.SHUTDOWN_RESTART, on_shutdown),
+            (Event.TICK, on_tick)]
+
+
+def subscriptions(layouts: Layouts, state: State) -> List[Tuple[Event, Handler]]:
+    return [(event, factory(layouts, state)) for event, factory in HANDLERS]
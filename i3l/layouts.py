@@ -1,9 +1,11 @@
 import logging
-from typing import List, Optional, Any, Union
+from copy import copy
+from typing import Dict, List, Optional, Any, Union
 
-from i3ipc import Con
+from i3ipc import Con, ConfigReply
 
-from i3l.corners import Corners
+from i3l.config import WorkspaceLayout
+from i3l.geometry import Node, Leaf, Split
 from i3l.mover import Mover
 from i3l.options import LayoutName, Direction, ResizeDirection, HorizontalPosition, VerticalPosition, ScreenDirection, \
     AlternateVerticalPosition
@@ -31,12 +33,18 @@ class Layout(Splittable):
     def _params(self) -> List[Any]:
         pass
 
+    def params(self) -> List[str]:
+        return [str(param) for param in self._params() or []]
+
     def anchor_mark(self) -> Optional[str]:
         pass
 
     def get_workspace_name(self) -> str:
         return self.workspace_name
 
+    def same_as(self, layout: Optional['Layout']) -> bool:
+        return layout is not None and self.name == layout.name and self._params() == layout._params()
+
     def split_direction(self, context: Context) -> Optional[Direction]:
         return None
 
@@ -60,6 +68,9 @@ class Layout(Splittable):
     def _update(self, context: Context):
         pass
 
+    def geometry(self, con_ids: List[int]) -> Optional[Node]:
+        return None
+
     @classmethod
     def create(cls, workspace_name: str, params: List[Any]) -> Optional['Layout']:
         pass
@@ -98,10 +109,21 @@ class Stack(Layout):
         if len(context.containers) == 2:
             context.exec(f'[con_id="{context.focused.id}"] move {self.second_axe_position.value}')
             context.exec(f'[con_id="{context.focused.id}"] move {self.second_axe_position.value}')
+            # i3 only lays containers out between messages, the resize needs the rects left by the moves
+            context.flush()
             size = context.workspace_width(1 - self.main_ratio) \
                 if self._resize_direction() == ResizeDirection.WIDTH else context.workspace_height(1 - self.main_ratio)
             context.exec(f'resize set {self._resize_direction().value} {size}')
 
+    def geometry(self, con_ids: List[int]) -> Optional[Node]:
+        if len(con_ids) == 1:
+            return Leaf(con_ids[0])
+        main = Leaf(con_ids[0], self.main_ratio)
+        stack = Split.even(self._second_direction(), con_ids[1:], 1 - self.main_ratio)
+        children = [main, stack] \
+            if self.second_axe_position in [HorizontalPosition.RIGHT, VerticalPosition.DOWN] else [stack, main]
+        return Split(self._first_direction(), children)
+
     def _first_direction(self) -> Direction:
         pass
 
@@ -188,14 +210,28 @@ class Spiral(Layout):
             if self.screen_direction == ScreenDirection.INSIDE and ((len(context.containers) - 1) / 2) % 2 == 0:
                 context.exec(f'[con_id="{context.focused.id}"] move up')
             if len(context.containers) > 1:
+                context.flush()
                 ratio = pow(1 - self.main_ratio, (len(context.containers) - 1) / 2)
                 context.exec(f'resize set height {context.workspace_height(ratio)}')
         else:
             if self.screen_direction == ScreenDirection.INSIDE and (len(context.containers) / 2) % 2 == 0:
                 context.exec(f'[con_id="{context.focused.id}"] move left')
+            context.flush()
             ratio = pow(1 - self.main_ratio, len(context.containers) / 2)
             context.exec(f'resize set width {context.workspace_width(ratio)}')
 
+    def geometry(self, con_ids: List[int]) -> Optional[Node]:
+        node: Node = Leaf(con_ids[-1])
+        for index in range(len(con_ids) - 2, -1, -1):
+            container_count = index + 2
+            node.percent = 1 - self.main_ratio
+            previous = Leaf(con_ids[index], self.main_ratio)
+            children = [node, previous] \
+                if self.screen_direction == ScreenDirection.INSIDE and (container_count // 2) % 2 == 0 \
+                else [previous, node]
+            node = Split(Direction.HORIZONTAL if container_count % 2 == 0 else Direction.VERTICAL, children)
+        return node
+
     @classmethod
     def create(cls, workspace_name: str, params: List[Any]) -> Optional['Layout']:
         return Spiral(workspace_name, params)
@@ -227,6 +263,7 @@ class Companion(Layout):
 
     def _update(self, context: Context):
         if len(context.containers) % 2 == 0:
+            context.flush()
             if (len(context.containers) / 2) % 2 == 1:
                 context.exec(f'resize set height {context.workspace_height(self.odd_companion_ratio)}')
             else:
@@ -238,9 +275,27 @@ class Companion(Layout):
             context.exec(f'[con_id="{context.focused.id}"] move right')
 
     def should_moves_up(self, ctx: Context) -> bool:
+        return self._moves_up(len(ctx.containers) // 2)
+
+    def _moves_up(self, column_number: int) -> bool:
         return self.companion_position == AlternateVerticalPosition.UP or \
-            (self.companion_position == AlternateVerticalPosition.ALTUP and (len(ctx.containers) / 2) % 2 == 1) or \
-            (self.companion_position == AlternateVerticalPosition.ALTDOWN and (len(ctx.containers) / 2) % 2 == 0)
+            (self.companion_position == AlternateVerticalPosition.ALTUP and column_number % 2 == 1) or \
+            (self.companion_position == AlternateVerticalPosition.ALTDOWN and column_number % 2 == 0)
+
+    def geometry(self, con_ids: List[int]) -> Optional[Node]:
+        columns = []
+        for index in range(0, len(con_ids), 2):
+            column_number = index // 2 + 1
+            if index + 1 < len(con_ids):
+                ratio = self.odd_companion_ratio if column_number % 2 == 1 else self.even_companion_ratio
+                main, companion = Leaf(con_ids[index], 1 - ratio), Leaf(con_ids[index + 1], ratio)
+                children = [companion, main] if self._moves_up(column_number) else [main, companion]
+                columns.append(Split(Direction.VERTICAL, children))
+            else:
+                columns.append(Leaf(con_ids[index]))
+        for column in columns:
+            column.percent = 1 / len(columns)
+        return Split.of(Direction.HORIZONTAL, columns)
 
     @classmethod
     def create(cls, workspace_name: str, params: List[Any]) -> Optional['Layout']:
@@ -279,21 +334,19 @@ class TwoColumns(Layout):
         candidates = sorted_containers[1:-1:2] if len(context.containers) % 2 == 0 else sorted_containers[:-1:2]
         self._move_container_to_lowest(context, candidates)
 
+    def geometry(self, con_ids: List[int]) -> Optional[Node]:
+        columns = [Split.even(Direction.VERTICAL, con_ids[::2], 0.5)]
+        if len(con_ids) > 1:
+            columns.append(Split.even(Direction.VERTICAL, con_ids[1::2], 0.5))
+        if self.first_column_position == HorizontalPosition.RIGHT:
+            columns.reverse()
+        return Split.of(Direction.HORIZONTAL, columns)
+
     def _move_container_to_lowest(self, context: Context, candidates: List[Con]):
-        lowest = self._lowest(candidates)
+        lowest = context.spatial_index().lowest(candidates)
         if lowest is not None:
             Mover(context).move_to_container(lowest.id)
 
-    @classmethod
-    def _lowest(cls, containers: List[Con]) -> Optional[Con]:
-        lower_y = 0
-        destination = None
-        for con in containers:
-            if con.rect.y >= lower_y:
-                destination = con
-                lower_y = con.rect.y
-        return destination
-
     @classmethod
     def create(cls, workspace_name: str, params: List[Any]) -> Optional['Layout']:
         return TwoColumns(workspace_name, params)
@@ -338,13 +391,14 @@ class ThreeColumns(Layout):
                    (self.second_column_position == HorizontalPosition.LEFT and not is_second_column)
         third_column_container_index = 3 if self.second_column_max == 0 else self.second_column_max + 2
 
-        corners = Corners(context.containers)
+        corners = context.spatial_index().corners()
         bottom_container = corners.bottom_right() if is_right else corners.bottom_left()
         direction = None if len(context.containers) not in [2, third_column_container_index] \
             else 'right' if is_right else 'left'
         Mover(context).move_to_container(bottom_container.id, direction)
 
         if len(context.containers) == 2:
+            context.flush()
             main_width = context.workspace_width(self.two_columns_main_ratio)
             context.exec(f'[con_mark="{self.mark_main()}"] resize set {main_width}')
         elif len(context.containers) == third_column_container_index:
@@ -356,6 +410,27 @@ class ThreeColumns(Layout):
             main_width_delta = containers[0].rect.width + stack_width_delta - main_width
             self._resize(context, 'con_mark', self.mark_main(), main_width_delta)
 
+    def geometry(self, con_ids: List[int]) -> Optional[Node]:
+        second_column, third_column = [], []
+        for index, con_id in enumerate(con_ids[1:]):
+            container_count = index + 2
+            is_second_column = (self.second_column_max == 0 and container_count % 2 == 0) or \
+                container_count - 1 <= self.second_column_max
+            (second_column if is_second_column else third_column).append(con_id)
+        if len(second_column) == 0:
+            return Leaf(con_ids[0])
+        if len(third_column) == 0:
+            columns = [Split.even(Direction.VERTICAL, second_column, 1 - self.two_columns_main_ratio),
+                       Leaf(con_ids[0], self.two_columns_main_ratio)]
+        else:
+            stack_ratio = (1 - self.three_columns_main_ratio) / 2
+            columns = [Split.even(Direction.VERTICAL, second_column, stack_ratio),
+                       Leaf(con_ids[0], self.three_columns_main_ratio),
+                       Split.even(Direction.VERTICAL, third_column, stack_ratio)]
+        if self.second_column_position == HorizontalPosition.RIGHT:
+            columns.reverse()
+        return Split(Direction.HORIZONTAL, columns)
+
     def _resize(self, context: Context, attr: str, value: str, delta: int):
         resize_direction = self.second_column_position.opposite().value
         resize_expansion = 'shrink' if delta >= 0 else 'grow'
@@ -470,6 +545,7 @@ class Layouts:
         self.layouts = {}
         for layout in layouts:
             self.layouts[layout.workspace_name] = layout
+        self.defaults = dict(self.layouts)
 
     def get(self, workspace_name: str, default: Layout = None) -> Optional[Layout]:
         return self.layouts[workspace_name] if workspace_name in self.layouts else default
@@ -482,9 +558,61 @@ class Layouts:
         if workspace_name in self.layouts:
             del self.layouts[workspace_name]
 
+    def reset(self, workspace_name: str):
+        if workspace_name in self.defaults:
+            self.layouts[workspace_name] = self.defaults[workspace_name]
+        else:
+            self.remove(workspace_name)
+
+    def rename(self, old_workspace_name: str, workspace_name: str) -> Optional[Layout]:
+        layout = self.get(old_workspace_name)
+        if layout is None:
+            return None
+        self.reset(old_workspace_name)
+        renamed_layout = copy(layout)
+        renamed_layout.workspace_name = workspace_name
+        return self.add(renamed_layout)
+
+    def reload(self, layouts: 'Layouts') -> List[str]:
+        # a layout switched at runtime is kept, only the workspaces still on their configured layout are changed
+        changed_workspace_names = []
+        defaults = dict(layouts.defaults)
+        for workspace_name in sorted(set(self.defaults) | set(layouts.defaults)):
+            default = self.defaults.get(workspace_name)
+            layout = layouts.defaults.get(workspace_name)
+            if default is not None and default.same_as(layout):
+                defaults[workspace_name] = default
+            elif self.layouts.get(workspace_name) is default:
+                changed_workspace_names.append(workspace_name)
+                if layout is not None:
+                    self.add(layout)
+                else:
+                    self.remove(workspace_name)
+        self.defaults = defaults
+        return changed_workspace_names
+
+    def overrides(self) -> Dict[str, Optional[Layout]]:
+        overrides: Dict[str, Optional[Layout]] = {workspace_name: None for workspace_name in self.defaults
+                                                  if workspace_name not in self.layouts}
+        overrides.update({workspace_name: layout for workspace_name, layout in self.layouts.items()
+                          if self.defaults.get(workspace_name) is not layout})
+        return overrides
+
     def exists_for(self, workspace_name: str) -> bool:
         return workspace_name in self.layouts
 
+    def uses(self, layout_name: LayoutName) -> bool:
+        return any(layout.name == layout_name for layout in self.layouts.values())
+
+    @classmethod
+    def load(cls, i3_config: ConfigReply) -> 'Layouts':
+        workspace_layouts = WorkspaceLayout.load(i3_config)
+        return Layouts([layout for layout in
+                        (cls.create(workspace_layout.layout_name,
+                                    workspace_layout.layout_params,
+                                    workspace_layout.workspace_name) for workspace_layout in workspace_layouts)
+                        if layout is not None])
+
     @classmethod
     def create(cls, name: str, params: List[Any], workspace_name: str) -> Optional['Layout']:
         try:
@@ -0,0 +1,84 @@
+import logging
+import shlex
+import subprocess
+import time
+from typing import List
+
+from i3l.stats import stats
+
+logger = logging.getLogger(__name__)
+
+
+class WindowMapper:
+
+    def unmap(self, window_id: int):
+        pass
+
+    def map(self, window_id: int, x: int, y: int, width: int, height: int):
+        pass
+
+    def flush(self):
+        pass
+
+    @staticmethod
+    def create(use_xdotool: bool = False) -> 'WindowMapper':
+        if use_xdotool:
+            return XdoWindowMapper()
+        try:
+            from Xlib.display import Display
+            from Xlib.error import DisplayError
+        except ImportError:
+            logger.warning('[mapper] python-xlib not available, falling back to xdotool')
+            return XdoWindowMapper()
+        try:
+            return XlibWindowMapper(Display())
+        except DisplayError as e:
+            logger.warning(f'[mapper] unable to open X display ({e}), falling back to xdotool')
+            return XdoWindowMapper()
+
+
+class XdoWindowMapper(WindowMapper):
+
+    def __init__(self):
+        self._commands: List[str] = []
+
+    def unmap(self, window_id: int):
+        self._commands.append(f'windowunmap {window_id}')
+
+    def map(self, window_id: int, x: int, y: int, width: int, height: int):
+        self._commands.append(f'windowsize {window_id} {width} {height} '
+                              f'windowmove {window_id} {x} {y} '
+                              f'windowmap {window_id}')
+
+    def flush(self):
+        if len(self._commands) == 0:
+            return
+        command = shlex.split(f'xdotool {" ".join(self._commands)}')
+        self._commands = []
+        start = time.perf_counter()
+        subprocess.run(command)
+        stats.add_subprocess_time(time.perf_counter() - start)
+
+
+class XlibWindowMapper(WindowMapper):
+
+    def __init__(self, display):
+        self._display = display
+
+    def unmap(self, window_id: int):
+        self._window(window_id).unmap(onerror=self._on_error)
+
+    def map(self, window_id: int, x: int, y: int, width: int, height: int):
+        window = self._window(window_id)
+        window.configure(x=x, y=y, width=width, height=height, onerror=self._on_error)
+        window.map(onerror=self._on_error)
+
+    def flush(self):
+        self._display.flush()
+
+    def _window(self, window_id: int):
+        return self._display.create_resource_object('window', window_id)
+
+    @staticmethod
+    def _on_error(error, request):
+        logger.warning(f'[mapper] X error {error}')
@@ -1,17 +1,17 @@
-import sys
-from math import sqrt
-from typing import List, Optional
+from typing import Optional
 
 from i3ipc import Con
 
+from i3l.spatial import AdjacencyGraph
 from i3l.splitter import Mark
 from i3l.state import Context
 
 
 class Mover:
 
-    def __init__(self, context: Context):
+    def __init__(self, context: Context, adjacency_graph: Optional[AdjacencyGraph] = None):
         self._context = context
+        self._adjacency_graph = adjacency_graph
 
     def forward(self, direction: str):
         self._context.exec(f'move {direction}')
@@ -26,42 +26,36 @@ class Mover:
             self._context.exec(f'move {direction}')
 
     def move_to_direction(self, direction: str, swap_mark_last: bool):
-        origin = self._context.focused
-        candidates = self._destination_candidates(direction, origin)
-        destination = self._shortest_distance(origin, candidates)
+        destination = self._neighbor(direction)
         if destination is not None:
             self.swap(destination, swap_mark_last)
 
+    def focus_direction(self, direction: str):
+        destination = self._neighbor(direction)
+        if destination is not None:
+            self._context.exec(f'[con_id="{destination.id}"] focus')
+        else:
+            self._context.exec(f'focus {direction}')
+
     def swap(self, destination: Con, swap_mark_last: bool, swap_marks=None):
         if swap_marks is None:
             swap_marks = []
         self._switch_marks(destination, swap_mark_last, swap_marks)
         if self._context.workspace_sequence is not None:
             self._context.workspace_sequence.switch_container_order(self._context.focused, destination)
+        if self._adjacency_graph is not None:
+            self._adjacency_graph.swap(self._context.focused.id, destination.id)
         self._context.exec(f'swap container with con_id {destination.id}')
 
-    def _destination_candidates(self, direction: str, origin: Con) -> List[Con]:
-        def vertical_overlap(candidate: Con):
-            return candidate.rect.y <= origin.rect.y <= candidate.rect.y + candidate.rect.height \
-                or candidate.rect.y <= origin.rect.y + origin.rect.height <= candidate.rect.y + candidate.rect.height
-
-        def horizontal_overlap(candidate: Con):
-            return candidate.rect.x <= origin.rect.x <= candidate.rect.x + candidate.rect.width \
-                or candidate.rect.x <= origin.rect.x + origin.rect.width < candidate.rect.x + candidate.rect.width
-
-        def overlap():
-            return horizontal_overlap if direction in ['up', 'down'] else vertical_overlap
-
-        factor = -1 if direction in ['right', 'down'] else 1
-
-        candidates = []
-        if direction in ['left', 'right']:
-            candidates = [con for con in self._context.containers
-                          if factor * con.rect.x < factor * origin.rect.x and overlap()(con)]
-        elif direction in ['up', 'down']:
-            candidates = [con for con in self._context.containers
-                          if factor * con.rect.y < factor * origin.rect.y and overlap()(con)]
-        return candidates
+    def _neighbor(self, direction: str) -> Optional[Con]:
+        origin = self._context.focused
+        if self._adjacency_graph is not None and self._adjacency_graph.contains(origin.id):
+            neighbor_id = self._adjacency_graph.neighbor(origin.id, direction)
+            neighbor = self._context.find_container(neighbor_id)
+            if neighbor_id is None or neighbor is not None:
+                return neighbor
+        # containers missing from the cached graph (floating toggled, aliases not refreshed yet) are searched directly
+        return self._context.spatial_index().nearest(direction, origin)
 
     def _switch_marks(self, destination: Con, swap_mark_last: bool, swap_marks=None):
         if swap_marks is None:
@@ -76,18 +70,3 @@ class Mover:
         for mark in origin_mark:
             if Mark.any(mark, mark_to_swap):
                 self._context.exec(f'[con_id="{destination.id}"] mark --add {mark}')
-
-    @classmethod
-    def _shortest_distance(cls, origin: Con, containers: List[Con]) -> Optional[Con]:
-        shortest_dist = sys.maxsize
-        destination = None
-        for con in containers:
-            dist = cls.container_distance(origin, con)
-            if dist < shortest_dist and not (origin.rect.x == con.rect.x and origin.rect.y == con.rect.y):
-                destination = con
-                shortest_dist = dist
-        return destination
-
-    @staticmethod
-    def container_distance(con1: Con, con2: Con) -> float:
-        return sqrt((con1.rect.x - con2.rect.x)**2 + (con1.rect.y - con2.rect.y)**2)
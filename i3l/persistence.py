@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from i3ipc import Connection
+
+from i3l.handlers import Handler
+from i3l.layouts import Layouts
+from i3l.runtime import runtime_dir
+from i3l.state import State
+
+logger = logging.getLogger(__name__)
+
+LayoutDefinition = Tuple[str, List[str]]
+SequenceDefinition = Tuple[List[int], bool]
+
+
+def default_state_path() -> Optional[str]:
+    directory = runtime_dir()
+    return os.path.join(directory, 'state.json') if directory is not None else None
+
+
+class StateStore:
+
+    def __init__(self, path: str, delay: float = 1.0):
+        self.path = path
+        self.delay = delay
+        self._signature = None
+        self._pending: Optional[Dict[str, Any]] = None
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def wrap(self, layouts: Layouts, state: State, handler: Handler) -> Handler:
+
+        def _persisted(i3l: Connection, e: Any):
+            result = handler(i3l, e)
+            self.changed(layouts, state)
+            return result
+
+        return _persisted
+
+    def changed(self, layouts: Layouts, state: State):
+        signature = (tuple((workspace_name, id(workspace_sequence), workspace_sequence.version,
+                            workspace_sequence.is_stale)
+                           for workspace_name, workspace_sequence in state.workspace_sequences.items()),
+                     tuple((workspace_name, id(layout)) for workspace_name, layout in layouts.layouts.items()))
+        if signature == self._signature:
+            return
+        self._signature = signature
+        snapshot = self.snapshot(layouts, state)
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._pending = snapshot
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            snapshot, self._pending = self._pending, None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if snapshot is not None:
+            self.write(snapshot)
+
+    def write(self, snapshot: Dict[str, Any]):
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            file_descriptor, temp_path = tempfile.mkstemp(prefix='.state-', dir=directory)
+            with os.fdopen(file_descriptor, 'w') as state_file:
+                json.dump(snapshot, state_file, separators=(',', ':'))
+            os.replace(temp_path, self.path)
+            logger.debug(f'[persistence] state saved to {self.path}')
+        except OSError as e:
+            logger.warning(f'[persistence] unable to save state to {self.path}: {e}')
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path) as state_file:
+                return json.load(state_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f'[persistence] unable to read state from {self.path}: {e}')
+            return None
+
+    def restore(self, layouts: Layouts, state: State):
+        snapshot = self.load()
+        if snapshot is None:
+            return
+        try:
+            definitions, sequences = self._parse(snapshot)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            logger.warning(f'[persistence] ignoring invalid state in {self.path}: {e!r}')
+            return
+        for workspace_name, definition in definitions.items():
+            if definition is None:
+                layouts.remove(workspace_name)
+                continue
+            layout = Layouts.create(definition[0], definition[1], workspace_name)
+            if layout is not None:
+                layouts.add(layout)
+        for workspace_name, (window_ids, stale) in sequences.items():
+            if not layouts.exists_for(workspace_name):
+                continue
+            workspace_sequence = state.restore_workspace_sequence(workspace_name, window_ids)
+            if workspace_sequence is not None and stale:
+                workspace_sequence.set_stale(True)
+        logger.info(f'[persistence] state restored from {self.path}')
+        self._signature = None
+        self.changed(layouts, state)
+
+    @staticmethod
+    def _parse(snapshot: Dict[str, Any]) -> Tuple[Dict[str, Optional[LayoutDefinition]], Dict[str, SequenceDefinition]]:
+        definitions = {str(workspace_name): None if definition is None
+                       else (str(definition['name']), [str(param) for param in definition['params']])
+                       for workspace_name, definition in snapshot.get('layouts', {}).items()}
+        sequences = {str(workspace_name): ([int(window_id) for window_id in sequence['windows']], bool(sequence['stale']))
+                     for workspace_name, sequence in snapshot.get('sequences', {}).items()}
+        return definitions, sequences
+
+    @staticmethod
+    def snapshot(layouts: Layouts, state: State) -> Dict[str, Any]:
+        return {'layouts': {workspace_name: None if layout is None else {'name': layout.name.value,
+                                                                         'params': layout.params()}
+                            for workspace_name, layout in layouts.overrides().items()},
+                'sequences': {workspace_name: {'windows': workspace_sequence.windows(),
+                                               'stale': workspace_sequence.is_stale}
+                              for workspace_name, workspace_sequence in state.workspace_sequences.items()}}
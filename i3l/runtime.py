@@ -0,0 +1,24 @@
+import logging
+import os
+import stat
+import tempfile
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def runtime_dir() -> Optional[str]:
+    # without $XDG_RUNTIME_DIR, fall back to a per user directory, only used if nobody else can write to it
+    xdg_runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    path = os.path.join(xdg_runtime_dir, 'i3-layouts') if xdg_runtime_dir \
+        else os.path.join(tempfile.gettempdir(), f'i3-layouts-{os.getuid()}')
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        path_stat = os.lstat(path)
+    except OSError as e:
+        logger.warning(f'[runtime] unable to create {path}: {e}')
+        return None
+    if not stat.S_ISDIR(path_stat.st_mode) or path_stat.st_uid != os.getuid() or path_stat.st_mode & 0o077:
+        logger.warning(f'[runtime] {path} is not a directory private to the current user, ignoring it')
+        return None
+    return path
@@ -0,0 +1,109 @@
+import sys
+from bisect import bisect_left, bisect_right
+from math import sqrt
+from typing import Dict, List, Optional
+
+from i3ipc import Con
+
+from i3l.corners import Corners
+
+DIRECTIONS = ['left', 'right', 'up', 'down']
+
+
+class SpatialIndex:
+
+    def __init__(self, containers: List[Con]):
+        self.containers = containers
+        self._positions: Dict[int, int] = {container.id: index for index, container in enumerate(containers)}
+        self._by_x = sorted(containers, key=lambda container: container.rect.x)
+        self._xs = [container.rect.x for container in self._by_x]
+        self._by_y = sorted(containers, key=lambda container: container.rect.y)
+        self._ys = [container.rect.y for container in self._by_y]
+        self._corners: Optional[Corners] = None
+
+    def corners(self) -> Corners:
+        if self._corners is None:
+            self._corners = Corners(self.containers)
+        return self._corners
+
+    def candidates(self, direction: str, origin: Con) -> List[Con]:
+        if direction == 'left':
+            candidates = [con for con in self._by_x[:bisect_left(self._xs, origin.rect.x)]
+                          if self._vertical_overlap(origin, con)]
+        elif direction == 'right':
+            candidates = [con for con in self._by_x[bisect_right(self._xs, origin.rect.x):]
+                          if self._vertical_overlap(origin, con)]
+        elif direction == 'up':
+            candidates = [con for con in self._by_y[:bisect_left(self._ys, origin.rect.y)]
+                          if self._horizontal_overlap(origin, con)]
+        elif direction == 'down':
+            candidates = [con for con in self._by_y[bisect_right(self._ys, origin.rect.y):]
+                          if self._horizontal_overlap(origin, con)]
+        else:
+            candidates = []
+        return sorted(candidates, key=lambda con: self._positions.get(con.id, 0))
+
+    def nearest(self, direction: str, origin: Con) -> Optional[Con]:
+        shortest_dist = sys.maxsize
+        destination = None
+        for con in self.candidates(direction, origin):
+            dist = self.distance(origin, con)
+            if dist < shortest_dist and not (origin.rect.x == con.rect.x and origin.rect.y == con.rect.y):
+                destination = con
+                shortest_dist = dist
+        return destination
+
+    def lowest(self, containers: List[Con]) -> Optional[Con]:
+        candidate_ids = set(container.id for container in containers)
+        index = len(self._by_y) - 1
+        while index >= 0 and self._by_y[index].id not in candidate_ids:
+            index -= 1
+        if index < 0:
+            return None
+        lower_y = self._by_y[index].rect.y
+        # several candidates may share the lowest y: keep the last one in the given order
+        return [con for con in containers if con.rect.y == lower_y][-1]
+
+    @staticmethod
+    def distance(con1: Con, con2: Con) -> float:
+        return sqrt((con1.rect.x - con2.rect.x)**2 + (con1.rect.y - con2.rect.y)**2)
+
+    @staticmethod
+    def _vertical_overlap(origin: Con, candidate: Con) -> bool:
+        return candidate.rect.y <= origin.rect.y <= candidate.rect.y + candidate.rect.height \
+            or candidate.rect.y <= origin.rect.y + origin.rect.height <= candidate.rect.y + candidate.rect.height
+
+    @staticmethod
+    def _horizontal_overlap(origin: Con, candidate: Con) -> bool:
+        return candidate.rect.x <= origin.rect.x <= candidate.rect.x + candidate.rect.width \
+            or candidate.rect.x <= origin.rect.x + origin.rect.width < candidate.rect.x + candidate.rect.width
+
+
+class AdjacencyGraph:
+
+    def __init__(self, neighbors: Dict[int, Dict[str, int]]):
+        self._neighbors = neighbors
+
+    def neighbor(self, con_id: int, direction: str) -> Optional[int]:
+        return self._neighbors.get(con_id, {}).get(direction)
+
+    def contains(self, con_id: int) -> bool:
+        return con_id in self._neighbors
+
+    def swap(self, con_id: int, other_id: int):
+        # swapped containers exchange their positions: relabel them instead of searching the neighbors again
+        swapped = {con_id: other_id, other_id: con_id}
+        self._neighbors = {swapped.get(origin_id, origin_id): {direction: swapped.get(destination_id, destination_id)
+                                                               for direction, destination_id in neighbors.items()}
+                           for origin_id, neighbors in self._neighbors.items()}
+
+    @staticmethod
+    def create(index: SpatialIndex) -> 'AdjacencyGraph':
+        neighbors: Dict[int, Dict[str, int]] = {}
+        for container in index.containers:
+            neighbors[container.id] = {}
+            for direction in DIRECTIONS:
+                destination = index.nearest(direction, container)
+                if destination is not None:
+                    neighbors[container.id][direction] = destination.id
+        return AdjacencyGraph(neighbors)
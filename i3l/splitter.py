@@ -68,7 +68,7 @@ class Splitter:
         self._context = context
 
     def handle_split(self, splittable: Splittable):
-        previous_lasts = self._context.tree.find_marked(splittable.mark_last())
+        previous_lasts = self._context.workspace.find_marked(splittable.mark_last())
         if len(previous_lasts) == 0:
             return
         previous_last = previous_lasts[0]
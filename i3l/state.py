@@ -1,13 +1,27 @@
 import logging
-import shlex
-import subprocess
+import re
+import sys
+from bisect import bisect_left
+from contextlib import contextmanager
 from enum import Enum
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Set, TYPE_CHECKING
 
 from i3ipc import Con, Connection, CommandReply, TickReply
 
+from i3l.mapper import WindowMapper
+from i3l.spatial import AdjacencyGraph, SpatialIndex
+from i3l.stats import stats
+from i3l.tree import ContainerSnapshot, TreeCache
+
+if TYPE_CHECKING:
+    from i3l.layouts import Layout
+
 logger = logging.getLogger(__name__)
 
+# commands leaving every container in place: marks are applied to the cached tree, and a split only changes the
+# orientation of the container parent or wraps the container into a new split container of the same size
+CACHED_TREE_COMMAND = re.compile(r'^(?:\[con_id="?(\d+)"?] )?(mark --add|unmark|split) (\S+)$')
+
 
 def is_floating_container(container: Con) -> bool:
     return container.floating == 'auto_on' or container.floating == 'user_on'
@@ -26,6 +40,9 @@ class RebuildCause(Enum):
     LAYOUT_CHANGE_3COLUMNS = 'layout_change_3columns'
     LAYOUT_CHANGE_TABBED = 'layout_change_tabbed'
     LAYOUT_CHANGE_AUTOSPLIT = 'layout_change_autosplit'
+    LAYOUT_CHANGE_SPLITV = 'layout_change_splitv'
+    LAYOUT_CHANGE_SPLITH = 'layout_change_splith'
+    LAYOUT_CHANGE_STACKING = 'layout_change_stacking'
     WORKSPACE_FOCUS = 'workspace_focus'
     WINDOW_CLOSE = 'window_close'
     WINDOW_MOVE = 'window_move'
@@ -39,41 +56,148 @@ class RebuildCause(Enum):
 class WorkspaceSequence:
     def __init__(self):
         self._container_count = 0
-        self._container_orders: Dict[int, int] = {}
+        self._window_orders: Dict[int, int] = {}
+        self._windows: Dict[int, int] = {}
+        self._orders: List[int] = []
+        # orders are kept by X window id, which survives an i3 restart, and con ids are aliases of these windows
+        self._aliases: Dict[int, int] = {}
+        self._con_ids: Dict[int, int] = {}
+        self.version = 0
         self.is_stale = False
-        self.stale_con_id = 0
+        self.stale_window = 0
+
+    def __len__(self):
+        return len(self._orders)
+
+    @property
+    def stale_con_id(self) -> int:
+        return self._con_ids.get(self.stale_window, 0)
 
     def contains(self, con_id: int):
-        return con_id in self._container_orders
+        return con_id in self._aliases
 
     def set_order(self, container: Con):
+        self._discard(self._aliases.get(container.id))
+        self._discard(container.window)
         self._container_count += 1
-        self._container_orders[container.id] = self._container_count
+        self._window_orders[container.window] = self._container_count
+        self._windows[self._container_count] = container.window
+        self._orders.append(self._container_count)
+        self._alias(container)
+        self.version += 1
+
+    def alias(self, container: Con) -> bool:
+        if container.window not in self._window_orders:
+            return False
+        if self._con_ids.get(container.window) != container.id:
+            self._aliases.pop(self._con_ids.get(container.window), None)
+            self._alias(container)
+            self.version += 1
+        return True
 
     def get_order(self, con_id: int) -> Optional[int]:
-        return self._container_orders[con_id] if con_id in self._container_orders else None
+        return self._window_orders.get(self._aliases.get(con_id))
+
+    def con_ids(self) -> List[int]:
+        return [self._con_ids[window] for window in self.windows() if window in self._con_ids]
+
+    def windows(self) -> List[int]:
+        return [self._windows[order] for order in self._orders]
+
+    def con_ids_after(self, con_id: int) -> List[int]:
+        index = bisect_left(self._orders, self.get_order(con_id))
+        windows = [self._windows[order] for order in self._orders[index:]]
+        return [self._con_ids[window] for window in windows if window in self._con_ids]
 
     def switch_container_order(self, origin: Con, destination: Con):
-        origin_number = destination_number = None
-        for con_id, number in self._container_orders.items():
-            if con_id == origin.id:
-                origin_number = number
-            elif con_id == destination.id:
-                destination_number = number
-        self._container_orders[destination.id] = origin_number
-        self._container_orders[origin.id] = destination_number
+        origin_window = self._aliases.get(origin.id)
+        destination_window = self._aliases.get(destination.id)
+        if origin_window is None or destination_window is None:
+            return
+        origin_number = self._window_orders[origin_window]
+        destination_number = self._window_orders[destination_window]
+        self._window_orders[destination_window] = origin_number
+        self._window_orders[origin_window] = destination_number
+        self._windows[origin_number] = destination_window
+        self._windows[destination_number] = origin_window
+        self.version += 1
+
+    def remove(self, con_id: int, window: Optional[int] = None):
+        # con ids are reused after an i3 restart: an alias not refreshed yet must not win over the window id
+        window = window if window is not None else self._aliases.get(con_id)
+        if window is not None and window == self.stale_window:
+            next_windows = self.windows()[self.windows().index(window) + 1:]
+            self.stale_window = next_windows[0] if len(next_windows) > 0 else 0
+        if self._discard(window):
+            self.version += 1
+
+    def size_of(self) -> int:
+        indexes = [self._window_orders, self._windows, self._orders, self._aliases, self._con_ids]
+        return sum(sys.getsizeof(index) for index in indexes)
+
+    def _alias(self, container: Con):
+        previous_window = self._aliases.get(container.id)
+        if previous_window is not None and previous_window != container.window:
+            self._con_ids.pop(previous_window, None)
+        self._aliases[container.id] = container.window
+        self._con_ids[container.window] = container.id
+
+    def _discard(self, window: Optional[int]) -> bool:
+        order = self._window_orders.pop(window, None)
+        if order is None:
+            return False
+        del self._orders[bisect_left(self._orders, order)]
+        del self._windows[order]
+        self._aliases.pop(self._con_ids.pop(window, None), None)
+        return True
+
+    def realias(self, containers: List[Con]):
+        # after an i3 restart, every alias is replaced and the windows closed meanwhile are forgotten
+        windows = [container.window for container in containers]
+        for window in [window for window in self.windows() if window not in windows]:
+            self.remove(0, window)
+        self._aliases = {}
+        self._con_ids = {}
+        for container in containers:
+            if container.window in self._window_orders:
+                self._alias(container)
+        self.version += 1
 
     def set_stale(self, stale: bool, con_id: int = 0):
         self.is_stale = stale
-        if con_id == 0 or \
-                self.stale_con_id == 0 or \
-                self._container_orders[con_id] < self._container_orders[self.stale_con_id]:
-            self.stale_con_id = con_id
+        window = self._aliases.get(con_id, 0)
+        if window == 0 or \
+                self.stale_window == 0 or \
+                self._window_orders[window] < self._window_orders[self.stale_window]:
+            self.stale_window = window
+
+
+class FocusHistory:
+    def __init__(self):
+        self.current_id: Optional[int] = None
+        self.previous_id: Optional[int] = None
+        self._expected_ids: List[int] = []
+
+    def expect(self, con_ids: List[int]):
+        self._expected_ids = list(con_ids)
+
+    def focus(self, con_id: int) -> bool:
+        # focus changes made by i3-layouts itself (in place rebuild) are not part of the history
+        if con_id in self._expected_ids:
+            self._expected_ids = self._expected_ids[self._expected_ids.index(con_id) + 1:]
+            return False
+        self._expected_ids = []
+        if con_id == self.current_id:
+            return False
+        self.previous_id = self.current_id
+        self.current_id = con_id
+        return True
 
 
 class RebuildContainer:
 
     def __init__(self, container: Con):
+        self.id = container.id
         self.window = container.window
         self.x = container.geometry.x
         self.y = container.geometry.y
@@ -84,22 +208,56 @@ class RebuildContainer:
 class Context:
     def __init__(self,
                  i3l: Connection,
-                 tree: Con,
-                 workspace_sequence: Optional[WorkspaceSequence]):
+                 tree_cache: TreeCache,
+                 workspace_sequence: Optional[WorkspaceSequence],
+                 window_mapper: WindowMapper):
         self.i3l = i3l
-        self.tree = tree
-        self.focused = tree.find_focused()
-        self.workspace = self.focused.workspace()
+        self.window_mapper = window_mapper
+        self.tree_cache = tree_cache
+        self.tree = tree_cache.tree
+        focused = self.tree.find_focused()
+        self.focused = focused.snapshot()
+        self.workspace = focused.workspace()
+        self.excluded_windows: Set[int] = set()
         self.containers = self._sync_containers(self.workspace)
+        self._sorted_containers: Optional[List[ContainerSnapshot]] = None
+        self._sorted_version: Optional[int] = None
+        self._spatial_index: Optional[SpatialIndex] = None
+        self._workspace_sequence: Optional[WorkspaceSequence] = None
         self.workspace_sequence = self._sync_workspace_sequence(self.containers, workspace_sequence) \
             if workspace_sequence is not None else None
+        self._commands: List[str] = []
+        self._batch_depth = 0
+
+    @property
+    def workspace_sequence(self) -> Optional[WorkspaceSequence]:
+        return self._workspace_sequence
+
+    @workspace_sequence.setter
+    def workspace_sequence(self, workspace_sequence: Optional[WorkspaceSequence]):
+        self._workspace_sequence = workspace_sequence
+        self._sorted_version = None
 
     def contains_container(self, con_id: int) -> bool:
         containers = [container for container in self.containers if container.id == con_id]
         return len(containers) > 0
 
-    def sorted_containers(self) -> List[Con]:
-        return sorted(self.containers, key=lambda container: self.workspace_sequence.get_order(container.id))
+    def find_container(self, con_id: Optional[int]) -> Optional[ContainerSnapshot]:
+        return next((container for container in self.containers if container.id == con_id), None)
+
+    def sorted_containers(self) -> List[ContainerSnapshot]:
+        if self._sorted_version != self.workspace_sequence.version:
+            containers = {container.id: container for container in self.containers}
+            self._sorted_containers = [containers.pop(con_id) for con_id in self.workspace_sequence.con_ids()
+                                       if con_id in containers]
+            self._sorted_containers.extend(containers.values())
+            self._sorted_version = self.workspace_sequence.version
+        return list(self._sorted_containers)
+
+    def spatial_index(self) -> SpatialIndex:
+        if self._spatial_index is None:
+            self._spatial_index = SpatialIndex(self.containers)
+        return self._spatial_index
 
     def workspace_width(self, ratio: float = 1.0) -> int:
         return int(self.workspace.rect.width * ratio)
@@ -107,79 +265,152 @@ class Context:
     def workspace_height(self, ratio: float = 1.0) -> int:
         return int(self.workspace.rect.height * ratio)
 
+    @contextmanager
+    def batch(self):
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.flush()
+
     def exec(self, payload: str) -> List[CommandReply]:
+        match = CACHED_TREE_COMMAND.match(payload)
+        con_id = int(match.group(1)) if match is not None and match.group(1) else None
+        if match is None:
+            self.tree_cache.invalidate()
+        elif match.group(2) == 'mark --add':
+            self.tree_cache.mark(con_id if con_id is not None else self.focused.id, match.group(3))
+        elif match.group(2) == 'unmark':
+            self.tree_cache.unmark(match.group(3), con_id)
+        return self._send(payload)
+
+    def mark(self, con_id: int, mark: str) -> List[CommandReply]:
+        self.tree_cache.mark(con_id, mark)
+        return self._send(f'[con_id="{con_id}"] mark --add {mark}')
+
+    def _send(self, payload: str) -> List[CommandReply]:
+        stats.count_command()
+        if self._batch_depth > 0:
+            self._commands.append(payload)
+            return []
+        stats.count_command_message()
+        return self.i3l.command(payload)
+
+    def flush(self) -> List[CommandReply]:
+        if len(self._commands) == 0:
+            return []
+        payload = '; '.join(self._commands)
+        self._commands = []
+        logger.debug(f'[context] flushing commands: {payload}')
+        stats.count_command_message()
         return self.i3l.command(payload)
 
     def send_tick(self, payload: str) -> TickReply:
+        self.flush()
         return self.i3l.send_tick(payload)
 
-    def xdo_unmap_window(self, window_id: Optional[int] = None):
+    def unmap_window(self, window_id: Optional[int] = None):
+        self.flush()
         if window_id is None:
             window_id = self.focused.window
-        command = shlex.split(f'xdotool windowunmap {window_id}')
-        subprocess.run(command)
-
-    def xdo_map_window(self, rebuild_container: RebuildContainer):
-        window_id = rebuild_container.window
-        command = shlex.split(f'xdotool windowsize {window_id} {rebuild_container.width} {rebuild_container.height} '
-                              f'windowmove {window_id} {rebuild_container.x} {rebuild_container.y} '
-                              f'windowmap {window_id}')
-        subprocess.run(command)
-
-    def resync(self) -> 'Context':
-        self.tree = self.i3l.get_tree()
+        self.window_mapper.unmap(window_id)
+        # the window leaves the tree behind the back of the cache
+        self.tree_cache.invalidate()
+
+    def map_windows(self, rebuild_containers: List[RebuildContainer]):
+        self.flush()
+        for rebuild_container in rebuild_containers:
+            self.window_mapper.map(rebuild_container.window,
+                                   rebuild_container.x, rebuild_container.y,
+                                   rebuild_container.width, rebuild_container.height)
+        self.window_mapper.flush()
+        self.tree_cache.invalidate()
+
+    def exclude_windows(self, window_ids: Iterable[int]):
+        self.excluded_windows = set(window_ids)
+        self.containers = [container for container in self.containers
+                           if container.window not in self.excluded_windows]
+        self._invalidate_containers()
+
+    def resync(self, workspace_sequences: Optional[Dict[str, WorkspaceSequence]] = None) -> 'Context':
+        self.flush()
+        self.tree = self.tree_cache.refresh(self.i3l)
         focused = self.tree.find_focused()
-        workspace = focused.workspace()
-        self.containers = self._sync_containers(workspace)
+        self.focused = focused.snapshot()
+        self.workspace = focused.workspace()
+        self.containers = self._sync_containers(self.workspace, self.excluded_windows)
+        self._invalidate_containers()
+        # without the workspace sequences, the focus is expected to stay on the same workspace
+        if workspace_sequences is not None:
+            workspace_sequence = workspace_sequences.get(self.workspace.name)
+            self.workspace_sequence = self._sync_workspace_sequence(self.containers, workspace_sequence) \
+                if workspace_sequence is not None else None
         return self
 
+    def _invalidate_containers(self):
+        self._sorted_version = None
+        self._spatial_index = None
+
     @classmethod
-    def _sync_containers(cls, workspace: Con) -> List[Con]:
-        containers = [container for container in workspace if is_layout_container(container)]
+    def _sync_containers(cls, workspace: Con, excluded_windows: Iterable[int] = ()) -> List[ContainerSnapshot]:
+        containers = [container for container in workspace.descendant_snapshots()
+                      if is_layout_container(container) and container.window not in excluded_windows]
         return sorted(containers, key=lambda container: container.window)
 
     @staticmethod
-    def _sync_workspace_sequence(containers: List[Con], workspace_sequence: WorkspaceSequence) -> WorkspaceSequence:
+    def _sync_workspace_sequence(containers: List[ContainerSnapshot],
+                                 workspace_sequence: WorkspaceSequence) -> WorkspaceSequence:
         for container in containers:
-            if workspace_sequence.get_order(container.id) is None:
+            if not workspace_sequence.alias(container):
                 workspace_sequence.set_order(container)
         return workspace_sequence
 
 
 class RebuildAction:
 
-    def __init__(self):
+    def __init__(self, batch_size: int = 1):
+        self.batch_size = max(batch_size, 1)
         self.rebuild_cause: Optional[RebuildCause] = None
         self.containers_to_close: List[int] = []
         self.containers_to_recreate: List[RebuildContainer] = []
         self.container_id_to_focus: Optional[int] = None
-        self.last_container_rebuilt: Optional[RebuildContainer] = None
+        self.mapped_windows: List[int] = []
+        self.pending_windows: List[int] = []
+        self.rebuilt_windows: List[int] = []
+        self.floating_disabled: Set[int] = set()
+        self.main_mark = ''
+        self.last_mark = ''
 
     @staticmethod
-    def _containers_after(con_id: int,
-                          containers: List[Con],
-                          workspace_sequence: WorkspaceSequence) -> List[RebuildContainer]:
-        return [RebuildContainer(con) for con in containers
-                if con_id == 0 or workspace_sequence.get_order(con.id) >= workspace_sequence.get_order(con_id)]
+    def containers_after(con_id: int,
+                         containers: List[ContainerSnapshot],
+                         workspace_sequence: WorkspaceSequence) -> List[RebuildContainer]:
+        if con_id == 0:
+            return [RebuildContainer(con) for con in containers]
+        con_ids_after = set(workspace_sequence.con_ids_after(con_id))
+        return [RebuildContainer(con) for con in containers if con.id in con_ids_after]
 
     def start_rebuild(self, context: Context, rebuild_cause: RebuildCause,
                       main_mark: str, last_mark: str, con_id: int = 0):
         if rebuild_cause is not None:
             self.rebuild_cause = rebuild_cause
+        self.main_mark = main_mark
+        self.last_mark = last_mark
 
         containers = context.sorted_containers()
         if len(containers) == 0 or (con_id != 0 and not context.workspace_sequence.contains(con_id)):
             self.end_rebuild(context)
             return
 
-        self.containers_to_recreate = self._containers_after(con_id, containers, context.workspace_sequence)
+        self.containers_to_recreate = self.containers_after(con_id, containers, context.workspace_sequence)
         self.containers_to_close = []
         if len(self.containers_to_recreate) > 0:
             for rebuild_container in self.containers_to_recreate:
-                context.xdo_unmap_window(rebuild_container.window)
+                context.unmap_window(rebuild_container.window)
                 self.containers_to_close.append(rebuild_container.window)
-            self.last_container_rebuilt = self.containers_to_recreate.pop(0)
-            context.xdo_map_window(self.last_container_rebuilt)
+            self.next_rebuild(context)
         elif len(containers) == 1:
             context.exec(f'[con_id="{containers[-1].id}"] mark --add {main_mark}')
             context.exec(f'[con_id="{containers[-1].id}"] mark --add {last_mark}')
@@ -189,8 +420,45 @@ class RebuildAction:
             self.end_rebuild(context)
 
     def next_rebuild(self, context: Context):
-        self.last_container_rebuilt = self.containers_to_recreate.pop(0)
-        context.xdo_map_window(self.last_container_rebuilt)
+        rebuild_containers = self.containers_to_recreate[:self.batch_size]
+        self.containers_to_recreate = self.containers_to_recreate[self.batch_size:]
+        self.mapped_windows = [rebuild_container.window for rebuild_container in rebuild_containers]
+        self.pending_windows = list(self.mapped_windows)
+        self.rebuilt_windows = []
+        context.map_windows(rebuild_containers)
+
+    def is_pending(self, window_id: int) -> bool:
+        return window_id in self.pending_windows and window_id not in self.floating_disabled
+
+    def container_rebuilt(self, context: Context, container: Con) -> bool:
+        if container.window in self.pending_windows:
+            self.pending_windows.remove(container.window)
+            self.rebuilt_windows.append(container.window)
+        self.floating_disabled.discard(container.window)
+        if len(self.pending_windows) > 0:
+            return False
+        self._reconcile_batch(context)
+        return True
+
+    def _reconcile_batch(self, context: Context):
+        # i3 may report the windows of a batch out of mapping order: swap them back into their slots
+        if self.rebuilt_windows == self.mapped_windows:
+            return
+        containers = {container.window: container for container in context.containers}
+        rebuilt_windows = list(self.rebuilt_windows)
+        for index, window_id in enumerate(self.mapped_windows):
+            if index >= len(rebuilt_windows) or rebuilt_windows[index] == window_id or window_id not in rebuilt_windows:
+                continue
+            other_index = rebuilt_windows.index(window_id)
+            origin = containers[rebuilt_windows[index]]
+            destination = containers[window_id]
+            context.exec(f'[con_id="{origin.id}"] swap container with con_id {destination.id}')
+            context.workspace_sequence.switch_container_order(origin, destination)
+            rebuilt_windows[index], rebuilt_windows[other_index] = rebuilt_windows[other_index], rebuilt_windows[index]
+        logger.debug(f'[state] rebuild batch reordered to {rebuilt_windows}')
+        sorted_containers = context.sorted_containers()
+        context.mark(sorted_containers[0].id, self.main_mark)
+        context.mark(sorted_containers[-1].id, self.last_mark)
 
     def end_rebuild(self, context: Context, cause: RebuildCause = None):
         rebuild_cause = self.rebuild_cause if cause is None else cause
@@ -202,29 +470,111 @@ class RebuildAction:
             self.rebuild_cause = None
 
 
+class InPlaceRebuild:
+    PARKING_WORKSPACE = 'i3l:rebuild'
+    ANCHOR_MARK = 'i3l::rebuild'
+
+    def __init__(self, state: 'State'):
+        self._state = state
+
+    def rebuild(self, context: Context, rebuild_cause: RebuildCause, layout: 'Layout', con_id: int = 0) -> bool:
+        # i3l.geometry builds on this module
+        from i3l.geometry import GeometryApplier, GeometryBuilder
+        containers = context.sorted_containers()
+        if len(containers) == 0 or (con_id != 0 and not context.workspace_sequence.contains(con_id)):
+            return False
+        con_ids = [container.id for container in containers]
+        target = layout.geometry(con_ids)
+        if target is None:
+            return False
+
+        # the whole workspace is rebuilt around the first leaf of the layout: the other containers are parked, brought
+        # back into the layout tree, then resized from one tree fetch
+        focused_id = context.focused.id if context.contains_container(context.focused.id) else None
+        with context.batch():
+            for parked_id in [parked_id for parked_id in con_ids if parked_id != target.leaves()[0]]:
+                context.exec(f'[con_id="{parked_id}"] move container to workspace {self.PARKING_WORKSPACE}')
+            context.flush()
+            for command in GeometryBuilder(self.ANCHOR_MARK).commands(target):
+                context.exec(command)
+            context.exec(f'unmark {self.ANCHOR_MARK}')
+            context.exec(f'[con_id="{con_ids[0]}"] mark --add {layout.mark_main()}')
+            context.exec(f'[con_id="{con_ids[-1]}"] mark --add {layout.mark_last()}')
+            if focused_id is not None:
+                context.exec(f'[con_id="{focused_id}"] focus')
+        self._state.focus_history.expect(con_ids + ([focused_id] if focused_id is not None else []))
+
+        # the caller context keeps describing the tree it was created from
+        context.tree_cache.refresh(context.i3l)
+        rebuilt_context = Context(context.i3l, context.tree_cache, None, context.window_mapper)
+        with rebuilt_context.batch():
+            if not GeometryApplier(rebuilt_context).apply(target, layout.mark_main(), layout.mark_last()):
+                logger.debug('[state] rebuilt tree does not match the layout, not resized')
+        logger.debug(f'[state] {len(con_ids)} containers rebuilt in place')
+        self._state.end_rebuild(context, rebuild_cause)
+        return True
+
+
 class State:
-    def __init__(self, i3):
+    def __init__(self, i3, window_mapper: Optional[WindowMapper] = None, reconcile_interval: float = 30.0,
+                 rebuild_in_place: bool = False, rebuild_batch_size: int = 1):
         self.context: Optional[Context] = None
+        self.window_mapper = window_mapper if window_mapper is not None else WindowMapper.create()
+        self.tree_cache = TreeCache(reconcile_interval)
         self.workspace_sequences: Dict[str, WorkspaceSequence] = {}
-        self.rebuild_action = RebuildAction()
+        self.rebuild_action = RebuildAction(rebuild_batch_size)
+        self.in_place_rebuild = InPlaceRebuild(self) if rebuild_in_place else None
+        self.focus_history = FocusHistory()
         self.old_workspace_name = ''
+        self.workspace_names: Dict[int, str] = {}
+        self.adjacency_graphs: Dict[str, AdjacencyGraph] = {}
+        self.restarting = False
         self.sync_context(i3)
+        for workspace in self.tree_cache.tree.workspaces():
+            self.workspace_names[workspace.id] = workspace.name
         for workspace in i3.get_workspaces():
             if workspace.focused:
                 self.add_workspace_sequence(workspace.name)
                 self.prev_workspace_name = workspace.name
 
     def sync_context(self, i3l: Connection) -> Context:
-        tree = i3l.get_tree()
-        focused = tree.find_focused()
-        workspace = focused.workspace()
+        self.tree_cache.refresh(i3l)
+        return self._create_context(i3l)
+
+    def sync_focus_context(self, i3l: Connection, container: Con) -> Context:
+        if not self.tree_cache.focus(container):
+            logger.debug('[state] tree cache invalid, fetching tree')
+            self.tree_cache.refresh(i3l)
+        return self._create_context(i3l)
+
+    def _create_context(self, i3l: Connection) -> Context:
+        workspace = self.tree_cache.tree.find_focused().workspace()
         workspace_sequence = self.get_workspace_sequence(workspace.name)
-        self.context = Context(i3l, tree, workspace_sequence)
+        self.context = Context(i3l, self.tree_cache, workspace_sequence, self.window_mapper)
         return self.context
 
+    def restart(self, i3l: Connection) -> Context:
+        # i3 gives new ids to every container when restarted in place, only the X window ids are kept
+        logger.debug('[state] i3 restarted, dropping container ids')
+        self.restarting = False
+        self.rebuild_action = RebuildAction(self.rebuild_action.batch_size)
+        self.focus_history = FocusHistory()
+        self.adjacency_graphs = {}
+        context = self.sync_context(i3l)
+        self.workspace_names = {}
+        for workspace in self.tree_cache.tree.workspaces():
+            self.workspace_names[workspace.id] = workspace.name
+            if workspace.name in self.workspace_sequences:
+                self.workspace_sequences[workspace.name].realias([container for container in
+                                                                  workspace.descendant_snapshots()
+                                                                  if is_layout_container(container)])
+        return context
+
     def handle_rebuild(self, context: Context, container: Con):
         if self.rebuild_action.rebuild_cause is None:
             self.end_rebuild(context, RebuildCause.WINDOW_NEW)
+        elif not self.rebuild_action.container_rebuilt(context, container):
+            logger.debug(f'[state] waiting for {len(self.rebuild_action.pending_windows)} rebuilt windows')
         elif len(self.rebuild_action.containers_to_recreate) == 0:
             self.end_rebuild(context)
         else:
@@ -232,10 +582,12 @@ class State:
                 self.rebuild_action.container_id_to_focus = container.id
             self.rebuild_action.next_rebuild(context)
 
-    def start_rebuild(self, rebuild_cause: RebuildCause, context: Context,
-                      main_mark: str, last_mark: str, con_id: int = 0):
+    def start_rebuild(self, rebuild_cause: RebuildCause, context: Context, layout: 'Layout', con_id: int = 0):
         logger.debug(f'[state] rebuilding for {rebuild_cause}')
-        self.rebuild_action.start_rebuild(context, rebuild_cause, main_mark, last_mark, con_id)
+        self.invalidate_adjacency_graph(context.workspace.name)
+        if self.in_place_rebuild is not None and self.in_place_rebuild.rebuild(context, rebuild_cause, layout, con_id):
+            return
+        self.rebuild_action.start_rebuild(context, rebuild_cause, layout.mark_main(), layout.mark_last(), con_id)
 
     def rebuild_closed_container(self, window_id: int) -> bool:
         if window_id in self.rebuild_action.containers_to_close:
@@ -244,11 +596,81 @@ class State:
         return False
 
     def end_rebuild(self, context: Context, cause: RebuildCause = None):
+        self.invalidate_adjacency_graph(context.workspace.name)
         self.rebuild_action.end_rebuild(context, cause)
 
     def is_last_container_rebuilt(self, container: Con):
-        return self.rebuild_action.last_container_rebuilt is not None and \
-            self.rebuild_action.last_container_rebuilt.window == container.window
+        return self.rebuild_action.is_pending(container.window)
+
+    def pending_windows(self, container: Con) -> List[int]:
+        return [window_id for window_id in self.rebuild_action.pending_windows if window_id != container.window]
+
+    def remove_container(self, con_id: int, window_id: Optional[int] = None):
+        for workspace_sequence in self.workspace_sequences.values():
+            workspace_sequence.remove(con_id, window_id)
+        for workspace_name in [name for name, graph in self.adjacency_graphs.items() if graph.contains(con_id)]:
+            self.invalidate_adjacency_graph(workspace_name)
+        if self.focus_history.previous_id == con_id:
+            self.focus_history.previous_id = None
+
+    def remove_workspace(self, workspace_id: int, workspace_name: str):
+        self.workspace_names.pop(workspace_id, None)
+        self.workspace_sequences.pop(workspace_name, None)
+        self.adjacency_graphs.pop(workspace_name, None)
+
+    def rename_workspace(self, workspace_id: int, workspace_name: str) -> Optional[str]:
+        old_workspace_name = self.workspace_names.get(workspace_id)
+        self.workspace_names[workspace_id] = workspace_name
+        if old_workspace_name is None or old_workspace_name == workspace_name:
+            return None
+        if old_workspace_name in self.workspace_sequences:
+            self.workspace_sequences[workspace_name] = self.workspace_sequences.pop(old_workspace_name)
+        if old_workspace_name in self.adjacency_graphs:
+            self.adjacency_graphs[workspace_name] = self.adjacency_graphs.pop(old_workspace_name)
+        if self.prev_workspace_name == old_workspace_name:
+            self.prev_workspace_name = workspace_name
+        if self.old_workspace_name == old_workspace_name:
+            self.old_workspace_name = workspace_name
+        return old_workspace_name
+
+    def adjacency_graph(self, context: Context) -> AdjacencyGraph:
+        # graphs are invalidated by the handlers changing the windows positions, not checked against the tree
+        adjacency_graph = self.adjacency_graphs.get(context.workspace.name)
+        if adjacency_graph is None:
+            logger.debug(f'[state] building adjacency graph for workspace {context.workspace.name}')
+            adjacency_graph = AdjacencyGraph.create(context.spatial_index())
+            self.adjacency_graphs[context.workspace.name] = adjacency_graph
+        return adjacency_graph
+
+    def invalidate_adjacency_graph(self, workspace_name: Optional[str] = None):
+        if workspace_name is None:
+            self.adjacency_graphs = {}
+        else:
+            self.adjacency_graphs.pop(workspace_name, None)
+
+    def memory_report(self) -> List[str]:
+        containers = sum(len(workspace_sequence) for workspace_sequence in self.workspace_sequences.values())
+        size = sum(workspace_sequence.size_of() for workspace_sequence in self.workspace_sequences.values())
+        return [f'workspace sequences: {len(self.workspace_sequences)} ({containers} containers, ~{size} bytes)',
+                f'workspace names: {len(self.workspace_names)}',
+                f'adjacency graphs: {len(self.adjacency_graphs)}',
+                f'cached tree nodes: {self.tree_cache.node_count()}']
+
+    def restore_workspace_sequence(self, workspace_name: str, window_ids: List[int]) -> Optional[WorkspaceSequence]:
+        workspace = next((workspace for workspace in self.tree_cache.tree.workspaces()
+                          if workspace.name == workspace_name), None)
+        if workspace is None:
+            return None
+        containers = {container.window: container for container in workspace.descendant_snapshots()
+                      if is_layout_container(container)}
+        workspace_sequence = WorkspaceSequence()
+        for window_id in window_ids:
+            if window_id in containers:
+                workspace_sequence.set_order(containers[window_id])
+        self.workspace_sequences[workspace_name] = workspace_sequence
+        if self.context.workspace.name == workspace_name:
+            self.add_workspace_sequence(workspace_name)
+        return workspace_sequence
 
     def get_workspace_sequence(self, workspace_name: str) -> Optional[WorkspaceSequence]:
         return self.workspace_sequences[workspace_name] if workspace_name in self.workspace_sequences else None
@@ -259,7 +681,7 @@ class State:
             self.workspace_sequences[workspace_name] = workspace_sequence
         if self.context.workspace.name == workspace_name:
             for container in self.context.containers:
-                if not self.workspace_sequences[workspace_name].contains(container.id):
+                if not self.workspace_sequences[workspace_name].alias(container):
                     self.workspace_sequences[workspace_name].set_order(container)
                     self.workspace_sequences[workspace_name].set_stale(True)
         self.context.workspace_sequence = self.workspace_sequences[workspace_name]
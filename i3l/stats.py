@@ -0,0 +1,151 @@
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from i3l.runtime import runtime_dir
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    BOUNDS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.buckets[bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, ratio: float) -> float:
+        rank = ratio * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if bucket > 0 and seen >= rank:
+                return self.BOUNDS[index] if index < len(self.BOUNDS) else self.max
+        return 0.0
+
+
+class EventStats:
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.trees = 0
+        self.commands = 0
+        self.command_messages = 0
+        self.subprocess_time = 0.0
+
+    def summary(self) -> str:
+        count = max(self.latency.count, 1)
+        return f'count:{self.latency.count} avg:{self.latency.total / count:.2f}ms ' \
+               f'p50:<{self.latency.percentile(0.5)}ms p95:<{self.latency.percentile(0.95)}ms ' \
+               f'max:{self.latency.max:.2f}ms trees:{self.trees / count:.1f} commands:{self.commands / count:.1f} ' \
+               f'messages:{self.command_messages / count:.1f} subprocess:{self.subprocess_time * 1000 / count:.2f}ms'
+
+
+class Stats:
+
+    def __init__(self):
+        self.enabled = False
+        self.events: Dict[Tuple[str, str], EventStats] = {}
+        self._current: Optional[EventStats] = None
+
+    @contextmanager
+    def event(self, event_name: str, layout_name: Callable[[], str]):
+        if not self.enabled or self._current is not None:
+            yield
+            return
+        self._current = EventStats()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            current, self._current = self._current, None
+            event_stats = self.events.setdefault((event_name, layout_name()), EventStats())
+            event_stats.latency.add((time.perf_counter() - start) * 1000)
+            event_stats.trees += current.trees
+            event_stats.commands += current.commands
+            event_stats.command_messages += current.command_messages
+            event_stats.subprocess_time += current.subprocess_time
+
+    def count_tree(self):
+        if self._current is not None:
+            self._current.trees += 1
+
+    def count_command(self):
+        if self._current is not None:
+            self._current.commands += 1
+
+    def count_command_message(self):
+        if self._current is not None:
+            self._current.command_messages += 1
+
+    def add_subprocess_time(self, seconds: float):
+        if self._current is not None:
+            self._current.subprocess_time += seconds
+
+    def summary(self) -> List[str]:
+        return [f'{event_name} [{layout_name}] {event_stats.summary()}'
+                for (event_name, layout_name), event_stats in sorted(self.events.items())]
+
+    def write(self, file_name: Optional[str] = None, memory_report: Optional[List[str]] = None):
+        lines = memory_report or []
+        if self.enabled:
+            lines = self.summary() + lines
+        else:
+            logger.info('[stats] statistics are disabled, start i3-layouts with --stats')
+        # any i3 IPC client can send the stats command: only write in the runtime directory
+        path = self._path(file_name) if file_name is not None else None
+        if path is None:
+            for line in lines:
+                logger.info(f'[stats] {line}')
+            return
+        with open(path, 'w') as stats_file:
+            stats_file.writelines(f'{line}\n' for line in lines)
+
+    @staticmethod
+    def _path(file_name: str) -> Optional[str]:
+        directory = runtime_dir()
+        file_name = os.path.basename(file_name)
+        if directory is None or file_name in ['', '.', '..']:
+            logger.warning(f'[stats] unable to write statistics to {file_name}, writing them to the log')
+            return None
+        return os.path.join(directory, file_name)
+
+    def reset(self):
+        self.events = {}
+
+
+class StartupProfile:
+
+    def __init__(self):
+        self.enabled = False
+        self.phases: List[Tuple[str, float]] = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, (time.perf_counter() - start) * 1000))
+
+    def report(self):
+        if not self.enabled:
+            return
+        for name, duration in self.phases:
+            logger.info(f'[startup] {name}: {duration:.2f}ms')
+        logger.info(f'[startup] ready after {(time.perf_counter() - self._start) * 1000:.2f}ms')
+
+
+stats = Stats()
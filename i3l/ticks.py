@@ -1,11 +1,16 @@
 import logging
 from typing import List, Optional
 
-from i3l.layouts import Layouts
+from i3ipc import Con
+
+from i3l.geometry import GeometryApplier
+from i3l.layouts import Layout, Layouts
 
 from i3l.mover import Mover
+from i3l.options import LayoutName
 from i3l.splitter import Mark
 from i3l.state import Context, RebuildCause, State
+from i3l.stats import stats
 
 logger = logging.getLogger(__name__)
 
@@ -20,16 +25,25 @@ class Tick:
     def do(self, context: Context, action_params: List[str]):
         pass
 
+    @staticmethod
+    def exists(action_name: str) -> bool:
+        return action_name in ['move', 'focus', 'swap', 'mark', 'stats', 'none'] or \
+            action_name in [layout_name.value for layout_name in LayoutName]
+
     @staticmethod
     def create(layouts: Layouts, state: State, action_name: str) -> Optional['Tick']:
         if action_name == 'rebuild':
             return None
         elif action_name == 'move':
             return MoveTick(layouts, state, action_name)
+        elif action_name == 'focus':
+            return FocusTick(layouts, state, action_name)
         elif action_name == 'swap':
             return SwapTick(layouts, state, action_name)
         elif action_name == 'mark':
             return MarkTick(layouts, state, action_name)
+        elif action_name == 'stats':
+            return StatsTick(layouts, state, action_name)
         else:
             return LayoutTick(layouts, state, action_name)
 
@@ -37,14 +51,26 @@ class Tick:
 class MoveTick(Tick):
 
     def do(self, context: Context, action_params: List[str]):
-        mover = Mover(context)
         layout = self._layouts.get(context.workspace.name)
         if layout is not None and not layout.is_i3():
             logger.debug('  [ipc] tick event - move container')
-            mover.move_to_direction(action_params[0], layout.swap_mark_last())
+            Mover(context, self._state.adjacency_graph(context)).move_to_direction(action_params[0],
+                                                                                   layout.swap_mark_last())
         else:
             logger.debug('  [ipc] tick event - move command forwarded to i3')
-            mover.forward(action_params[0])
+            Mover(context).forward(action_params[0])
+
+
+class FocusTick(Tick):
+
+    def do(self, context: Context, action_params: List[str]):
+        layout = self._layouts.get(context.workspace.name)
+        if layout is not None and not layout.is_i3():
+            logger.debug('  [ipc] tick event - focus container')
+            Mover(context, self._state.adjacency_graph(context)).focus_direction(action_params[0])
+        else:
+            logger.debug('  [ipc] tick event - focus command forwarded to i3')
+            context.exec(f'focus {action_params[0]}')
 
 
 class SwapTick(Tick):
@@ -57,16 +83,39 @@ class SwapTick(Tick):
         destination_mark = Mark.previous() if action_params[-1] == 'previous' else action_params[-1]
         swap_marks = [] if action_params[0] == "container" else [destination_mark]
         logger.debug(f'  [ipc] tick event - swap command to {destination_mark}')
-        destination = next(iter(context.tree.find_marked(destination_mark)), None)
+        if action_params[-1] == 'previous':
+            destination = self._previous_container(context, destination_mark)
+        else:
+            destination = next(iter(context.tree.find_marked(destination_mark)), None)
         layout = self._layouts.get(workspace_name)
         if destination is not None:
             mover.swap(destination, layout.swap_mark_last() if layout is not None else False, swap_marks)
+            # the destination may belong to another workspace
+            self._state.invalidate_adjacency_graph()
+
+    def _previous_container(self, context: Context, previous_mark: str) -> Optional[Con]:
+        # the previous focus is only tracked in memory: mark it now that a swap needs it
+        previous_id = self._state.focus_history.previous_id
+        destination = context.tree.find_by_id(previous_id) if previous_id is not None else None
+        if destination is not None and previous_mark not in destination.marks:
+            context.mark(destination.id, previous_mark)
+        return destination
 
 
 class MarkTick(Tick):
 
     def do(self, context: Context, action_params: List[str]):
-        context.exec(f'[con_id={context.focused.id}] mark --add {action_params[0]}')
+        context.mark(context.focused.id, action_params[0])
+
+
+class StatsTick(Tick):
+
+    def do(self, context: Context, action_params: List[str]):
+        if len(action_params) > 0 and action_params[0] == 'reset':
+            stats.reset()
+        else:
+            memory_report = self._state.memory_report() + [f'workspace layouts: {len(self._layouts.layouts)}']
+            stats.write(action_params[0] if len(action_params) > 0 else None, memory_report)
 
 
 class LayoutTick(Tick):
@@ -76,9 +125,18 @@ class LayoutTick(Tick):
         if layout is not None:
             logger.debug(f'  [ipc] tick event - set workspace layout to {self._action_name}')
             self._layouts.add(layout)
-            self._state.add_workspace_sequence(context.workspace.name)
-            self._state.start_rebuild(RebuildCause.layout_change(self._action_name), context, layout.mark_main(),
-                                      layout.mark_last())
+            self.apply(context, layout)
         else:
             logger.debug('  [ipc] tick event - unset workspace layout')
             self._layouts.remove(context.workspace.name)
+
+    def apply(self, context: Context, layout: Layout):
+        self._state.add_workspace_sequence(context.workspace.name)
+        rebuild_cause = RebuildCause.layout_change(layout.name.value)
+        con_ids = [container.id for container in context.sorted_containers()]
+        if len(con_ids) > 0 and GeometryApplier(context).apply(layout.geometry(con_ids),
+                                                               layout.mark_main(), layout.mark_last()):
+            logger.debug('  [ipc] tick event - layout applied on the existing tree')
+            self._state.end_rebuild(context, rebuild_cause)
+        else:
+            self._state.start_rebuild(rebuild_cause, context, layout)
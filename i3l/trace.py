@@ -0,0 +1,211 @@
+import argparse
+import gzip
+import json
+import logging
+import sys
+import threading
+import time
+from typing import Any, Dict, IO, List, Optional
+
+from i3ipc import Connection, Event, TickEvent
+from i3ipc.events import BindingEvent, ShutdownEvent, WindowEvent, WorkspaceEvent
+from i3ipc._private import MessageType
+
+from i3l.handlers import Handler, on_control, subscriptions
+from i3l.layouts import Layouts
+from i3l.mapper import WindowMapper
+from i3l.state import State
+from i3l.stats import stats
+
+logger = logging.getLogger(__name__)
+
+# entries replayed through a handler, the replies recorded after them belong to this handler
+HANDLED_KINDS = ['event', 'control']
+
+
+def open_trace(path: str, mode: str) -> IO[str]:
+    return gzip.open(path, f'{mode}t') if path.endswith('.gz') else open(path, mode)
+
+
+class TraceRecorder:
+
+    def __init__(self, path: str):
+        self._file = open_trace(path, 'a')
+        self._last_replies: Dict[int, str] = {}
+        # the i3 config and the initial tree are fetched from two threads at startup
+        self._lock = threading.Lock()
+
+    def start(self, options: Dict[str, Any]):
+        with self._lock:
+            self._write({'k': 'start', 't': time.time(), 'o': options})
+        self.flush()
+
+    def event(self, event: Event, data: Dict[str, Any]):
+        with self._lock:
+            self._write({'k': 'event', 't': time.time(), 'e': event.value, 'd': data})
+
+    def control(self, request: str):
+        with self._lock:
+            self._write({'k': 'control', 't': time.time(), 'r': request})
+
+    def reply(self, message_type: MessageType, payload: str, reply: str):
+        # a reply identical to the previous one of the same type (mostly trees) is only referenced
+        with self._lock:
+            same = self._last_replies.get(message_type.value) == reply
+            self._last_replies[message_type.value] = reply
+            self._write({'k': 'reply', 'm': message_type.value, 'p': payload, 'r': None if same else reply})
+
+    def wrap(self, event: Event, handler: Handler) -> Handler:
+
+        def _recorded(i3l: Connection, e: Any):
+            self.event(event, e.ipc_data)
+            try:
+                handler(i3l, e)
+            finally:
+                self.flush()
+
+        return _recorded
+
+    def wrap_control(self, handler: Handler) -> Handler:
+
+        def _recorded(i3l: Connection, request: str):
+            self.control(request)
+            try:
+                return handler(i3l, request)
+            finally:
+                self.flush()
+
+        return _recorded
+
+    def flush(self):
+        # gzip files are flushed with Z_SYNC_FLUSH: what is written so far can be read back without the end of stream
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def _write(self, entry: Dict[str, Any]):
+        self._file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+
+class RecordingConnection(Connection):
+
+    def __init__(self, recorder: TraceRecorder, socket_path: Optional[str] = None, auto_reconnect: bool = False):
+        super().__init__(socket_path, auto_reconnect)
+        self._recorder = recorder
+
+    def _message(self, message_type: MessageType, payload: str) -> str:
+        reply = super()._message(message_type, payload)
+        self._recorder.reply(message_type, payload, reply)
+        return reply
+
+
+class ReplayConnection(Connection):
+
+    def __init__(self, entries: List[Dict[str, Any]]):
+        self._entries = entries
+        self._position = 0
+        self._last_replies: Dict[int, str] = {}
+        self.missing_replies = 0
+        self.replayed_commands: List[str] = []
+
+    def seek(self, position: int):
+        self._position = position
+
+    def _message(self, message_type: MessageType, payload: str) -> str:
+        if message_type == MessageType.COMMAND:
+            self.replayed_commands.extend(command.strip() for command in payload.split(';'))
+        position = self._position
+        while position < len(self._entries) and self._entries[position]['k'] not in HANDLED_KINDS:
+            entry = self._entries[position]
+            position += 1
+            if entry['k'] != 'reply':
+                continue
+            if entry['r'] is not None:
+                self._last_replies[entry['m']] = entry['r']
+            if entry['m'] == message_type.value:
+                self._position = position
+                return self._last_replies[entry['m']]
+        self.missing_replies += 1
+        logger.debug(f'[trace] no recorded reply for {message_type.name}')
+        if message_type == MessageType.COMMAND:
+            return json.dumps([{'success': True} for _ in payload.split(';')])
+        if message_type in [MessageType.SEND_TICK, MessageType.SUBSCRIBE]:
+            return json.dumps({'success': True})
+        return self._last_replies.get(message_type.value, '[]')
+
+
+class TracePlayer:
+
+    def __init__(self, entries: List[Dict[str, Any]]):
+        self._entries = entries
+        self.options = next((entry['o'] for entry in entries if entry['k'] == 'start'), {})
+        self.i3l = ReplayConnection(entries)
+
+    @staticmethod
+    def load(path: str) -> 'TracePlayer':
+        entries = []
+        with open_trace(path, 'r') as trace_file:
+            try:
+                for line in trace_file:
+                    if line.strip():
+                        entries.append(json.loads(line))
+            except (EOFError, ValueError) as e:
+                # a trace recorded by a killed i3-layouts may end in the middle of a line or of the gzip stream
+                logger.warning(f'[trace] trace truncated after {len(entries)} entries: {e}')
+        return TracePlayer(entries)
+
+    def play(self) -> int:
+        layouts = Layouts.load(self.i3l.get_config())
+        state = State(self.i3l, WindowMapper(), self.options.get('reconcile_interval', 30.0),
+                      self.options.get('rebuild', 'remap') == 'in-place', self.options.get('rebuild_batch', 1))
+        handlers = {event.value: handler for event, handler in subscriptions(layouts, state)}
+        control_handler = on_control(layouts, state)
+        count = 0
+        for position, entry in enumerate(self._entries):
+            if entry['k'] == 'control':
+                self.i3l.seek(position + 1)
+                control_handler(self.i3l, entry['r'])
+            elif entry['k'] == 'event' and entry['e'] in handlers:
+                self.i3l.seek(position + 1)
+                handlers[entry['e']](self.i3l, self._event(entry['e'], entry['d']))
+            else:
+                continue
+            count += 1
+        return count
+
+    def _event(self, event_name: str, data: Dict[str, Any]) -> Any:
+        if event_name.startswith('window'):
+            return WindowEvent(data, self.i3l)
+        if event_name.startswith('workspace'):
+            return WorkspaceEvent(data, self.i3l)
+        if event_name == Event.BINDING.value:
+            return BindingEvent(data)
+        if event_name.startswith('shutdown'):
+            return ShutdownEvent(data)
+        return TickEvent(data)
+
+
+def replay():
+    parser = argparse.ArgumentParser(description='replay a trace recorded with i3-layouts --record')
+    parser.add_argument('trace')
+    parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--stats', action='store_true')
+    args = parser.parse_args()
+    logging.basicConfig(stream=sys.stdout,
+                        format='[%(asctime)s] %(levelname)s {%(filename)s:%(lineno)d} - %(message)s',
+                        level=logging.DEBUG if args.debug else logging.INFO)
+    stats.enabled = args.stats
+
+    player = TracePlayer.load(args.trace)
+    start = time.perf_counter()
+    count = player.play()
+    logger.info(f'[trace] {count} events replayed in {(time.perf_counter() - start) * 1000:.2f}ms, '
+                f'{player.i3l.missing_replies} replies missing from the trace')
+    stats.write()
+
+
+if __name__ == "__main__":
+    replay()
@@ -0,0 +1,186 @@
+import json
+import logging
+import time
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from i3ipc import Con, Connection
+from i3ipc._private import MessageType
+
+from i3l.stats import stats
+
+logger = logging.getLogger(__name__)
+
+
+class Rectangle(NamedTuple):
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+class ContainerSnapshot:
+    __slots__ = ['id', 'window', 'type', 'floating', 'marks', 'layout', 'orientation', 'percent', 'rect', 'geometry',
+                 'parent_id']
+
+    def __init__(self, data: Dict[str, Any], parent_id: Optional[int] = None):
+        self.id: int = data['id']
+        self.window: Optional[int] = data.get('window')
+        self.type: str = data.get('type')
+        self.floating: Optional[str] = data.get('floating')
+        self.marks: List[str] = data.get('marks', [])
+        self.layout: Optional[str] = data.get('layout')
+        self.orientation: Optional[str] = data.get('orientation')
+        self.percent: Optional[float] = data.get('percent')
+        self.rect = Rectangle(**data['rect'])
+        self.geometry = Rectangle(**data['geometry']) if 'geometry' in data else None
+        self.parent_id = parent_id
+
+    def __repr__(self):
+        return f'ContainerSnapshot(id={self.id}, window={self.window}, rect={tuple(self.rect)})'
+
+
+class LazyCon(Con):
+
+    def __init__(self, data: Dict[str, Any], parent: Optional[Con], conn: Connection):
+        self._nodes: Optional[List[Con]] = None
+        self._floating_nodes: Optional[List[Con]] = None
+        super().__init__({key: value for key, value in data.items() if key not in ['nodes', 'floating_nodes']},
+                         parent, conn)
+        self.ipc_data = data
+        self._nodes = None
+        self._floating_nodes = None
+
+    @property
+    def nodes(self) -> List[Con]:
+        if self._nodes is None:
+            self._nodes = [self.__class__(node, self, self._conn) for node in self.ipc_data.get('nodes', [])]
+        return self._nodes
+
+    @nodes.setter
+    def nodes(self, nodes: List[Con]):
+        self._nodes = nodes
+
+    @property
+    def floating_nodes(self) -> List[Con]:
+        if self._floating_nodes is None:
+            self._floating_nodes = [self.__class__(node, self, self._conn)
+                                    for node in self.ipc_data.get('floating_nodes', [])]
+        return self._floating_nodes
+
+    @floating_nodes.setter
+    def floating_nodes(self, floating_nodes: List[Con]):
+        self._floating_nodes = floating_nodes
+
+    @property
+    def focused(self) -> bool:
+        return self.ipc_data.get('focused', False)
+
+    @focused.setter
+    def focused(self, focused: bool):
+        self.ipc_data['focused'] = focused
+
+    def snapshot(self) -> ContainerSnapshot:
+        return ContainerSnapshot(self.ipc_data, self.parent.id if self.parent is not None else None)
+
+    def descendant_snapshots(self) -> List[ContainerSnapshot]:
+        snapshots = []
+        stack = [(child, self.id) for child in reversed(TreeCache.children(self.ipc_data))]
+        while stack:
+            data, parent_id = stack.pop()
+            snapshots.append(ContainerSnapshot(data, parent_id))
+            stack.extend((child, data['id']) for child in reversed(TreeCache.children(data)))
+        return snapshots
+
+    def find_marked_ids(self, mark: str) -> List[int]:
+        return [node['id'] for node in TreeCache.walk(self.ipc_data) if mark in node.get('marks', [])]
+
+    def find_focused(self) -> Optional[Con]:
+        con = self
+        while con.focus:
+            con = next((child for child in con.nodes + con.floating_nodes if child.id == con.focus[0]), None)
+            if con is None:
+                break
+            if con.focused:
+                return con
+        return super().find_focused()
+
+
+class TreeCache:
+    def __init__(self, reconcile_interval: float = 30.0):
+        self.tree: Optional[LazyCon] = None
+        self.reconcile_interval = reconcile_interval
+        self._synced_at = 0.0
+
+    def refresh(self, i3l: Connection) -> Con:
+        # i3 can only send the whole tree: decode it, but defer building Con objects
+        # (Connection._message is private i3ipc API, hence the i3ipc~=2.2.1 pin)
+        stats.count_tree()
+        data = i3l._message(MessageType.GET_TREE, '')
+        self.tree = LazyCon(json.loads(data), None, i3l)
+        self._synced_at = time.monotonic()
+        return self.tree
+
+    def invalidate(self):
+        self.tree = None
+
+    def is_valid(self) -> bool:
+        return self.tree is not None and time.monotonic() - self._synced_at < self.reconcile_interval
+
+    def node_count(self) -> int:
+        return sum(1 for _ in self.walk(self.tree.ipc_data)) if self.tree is not None else 0
+
+    def focus(self, container: Con) -> bool:
+        if not self.is_valid():
+            return False
+        path = self._path_to(container.id)
+        if path is None or path[-1].get('window') != container.window:
+            logger.debug(f'[tree] container {container.id} diverged from cached tree')
+            return False
+        for node in self.walk(self.tree.ipc_data):
+            if node.get('focused', False):
+                node['focused'] = False
+        path[-1]['focused'] = True
+        for parent, child in zip(path, path[1:]):
+            if child['id'] in parent.get('focus', []):
+                parent['focus'].remove(child['id'])
+                parent['focus'].insert(0, child['id'])
+        return True
+
+    def mark(self, con_id: int, mark: str):
+        if self.tree is None:
+            return
+        for node in self.walk(self.tree.ipc_data):
+            marks = node.get('marks', [])
+            if mark in marks:
+                marks.remove(mark)
+            if node['id'] == con_id:
+                marks.append(mark)
+                node['marks'] = marks
+
+    def unmark(self, mark: str, con_id: Optional[int] = None):
+        if self.tree is None:
+            return
+        for node in self.walk(self.tree.ipc_data):
+            if (con_id is None or node['id'] == con_id) and mark in node.get('marks', []):
+                node['marks'].remove(mark)
+
+    def _path_to(self, con_id: int) -> Optional[List[Dict[str, Any]]]:
+        stack = [[self.tree.ipc_data]]
+        while stack:
+            path = stack.pop()
+            if path[-1]['id'] == con_id:
+                return path
+            stack.extend(path + [child] for child in self.children(path[-1]))
+        return None
+
+    @classmethod
+    def walk(cls, data: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        stack = [data]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(cls.children(node))
+
+    @staticmethod
+    def children(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return data.get('nodes', []) + data.get('floating_nodes', [])
@@ -20,13 +20,15 @@ setuptools.setup(
         "Operating System :: POSIX :: Linux",
     ],
     install_requires=[
-        'i3ipc'
+        'i3ipc~=2.2.1',
+        'python-xlib~=0.33'
     ],
     tests_require=[
-        'python-xlib'
+        'python-xlib~=0.33'
     ],
     entry_points={
-        'console_scripts': ['i3-layouts=i3l.cli:main']
+        'console_scripts': ['i3-layouts=i3l.cli:main', 'i3-layouts-replay=i3l.cli:replay_main',
+                            'i3-layouts-msg=i3l.cli:msg_main']
     },
     scripts=[
         'scripts/i3l'
@@ -0,0 +1,105 @@
+import argparse
+import time
+from typing import Callable, List, NamedTuple
+
+from i3ipc import Connection, TickEvent
+from i3ipc.events import WindowEvent
+
+from i3l.handlers import on_window_new, on_window_close, on_tick
+from i3l.layouts import Layouts
+from i3l.state import State
+from test.fake_i3 import FakeI3Server, FakeTree, RecordingWindowMapper
+
+WINDOW_COUNTS = [1, 10, 50, 100, 200]
+
+
+class Result(NamedTuple):
+    layout_name: str
+    event: str
+    window_count: int
+    wall_time: float
+    round_trips: int
+    commands: int
+    bytes: int
+
+    def __str__(self):
+        return f'{self.layout_name:<10} {self.event:<12} {self.window_count:>7} {self.wall_time * 1000:>9.2f} ' \
+               f'{self.round_trips:>11} {self.commands:>8} {self.bytes:>9}'
+
+
+class Benchmark:
+
+    def __init__(self, server: FakeI3Server, rebuild_in_place: bool = False):
+        self.server = server
+        self.rebuild_in_place = rebuild_in_place
+
+    def run(self, layout_name: str, window_count: int) -> List[Result]:
+        layout_names = [name.value for name in Layouts.factory]
+        next_layout_name = layout_names[(layout_names.index(layout_name) + 1) % len(layout_names)]
+        return [self.measure(layout_name, 'window_new', window_count, self.window_new),
+                self.measure(layout_name, 'window_close', window_count, self.window_close),
+                self.measure(layout_name, f'{next_layout_name}', window_count, self.layout_tick(next_layout_name))]
+
+    def measure(self, layout_name: str, event: str, window_count: int,
+                handle: Callable[[Connection, FakeTree, Layouts, State], None]) -> Result:
+        tree = FakeTree()
+        tree.add_windows(window_count - 1)
+        self.server.tree = tree
+        i3l = self.server.connect()
+        layout = Layouts.create(layout_name, [], tree.workspace_name)
+        layouts = Layouts([layout])
+        # the workspace is measured as left by i3-layouts, with its first and last containers marked
+        if len(tree.windows) > 0:
+            tree.run_command(f'[con_id="{tree.windows[0]}"] mark --add {layout.mark_main()}')
+            tree.run_command(f'[con_id="{tree.windows[-1]}"] mark --add {layout.mark_last()}')
+        state = State(i3l, RecordingWindowMapper(), rebuild_in_place=self.rebuild_in_place)
+        self.server.reset()
+        start = time.perf_counter()
+        handle(i3l, tree, layouts, state)
+        wall_time = time.perf_counter() - start
+        return Result(layout_name, event, window_count, wall_time, self.server.round_trips(),
+                      len(self.server.commands), self.server.bytes_received + self.server.bytes_sent)
+
+    @staticmethod
+    def window_new(i3l: Connection, tree: FakeTree, layouts: Layouts, state: State):
+        con_id = tree.add_windows(1)[0]
+        event = WindowEvent({'change': 'new', 'container': tree.window(con_id)}, i3l)
+        on_window_new(layouts, state)(i3l, event)
+
+    @staticmethod
+    def window_close(i3l: Connection, tree: FakeTree, layouts: Layouts, state: State):
+        con_id = tree.windows[len(tree.windows) // 2] if len(tree.windows) > 0 else tree.add_windows(1)[0]
+        event = WindowEvent({'change': 'close', 'container': tree.window(con_id)}, i3l)
+        tree.remove_window(con_id)
+        on_window_close(layouts, state)(i3l, event)
+
+    @staticmethod
+    def layout_tick(layout_name: str) -> Callable[[Connection, FakeTree, Layouts, State], None]:
+
+        def _layout_tick(i3l: Connection, tree: FakeTree, layouts: Layouts, state: State):
+            on_tick(layouts, state)(i3l, TickEvent({'first': False, 'payload': f'i3-layouts {layout_name}'}))
+
+        return _layout_tick
+
+
+def main():
+    parser = argparse.ArgumentParser(description='measure i3-layouts handlers against a fake i3 IPC server')
+    parser.add_argument('--max-windows', type=int, default=200)
+    parser.add_argument('--layouts', nargs='*', default=[name.value for name in Layouts.factory])
+    parser.add_argument('--rebuild', choices=['in-place', 'remap'], default='remap')
+    args = parser.parse_args()
+
+    server = FakeI3Server(FakeTree()).start()
+    try:
+        print(f'{"layout":<10} {"event":<12} {"windows":>7} {"time (ms)":>9} {"round trips":>11} {"commands":>8} '
+              f'{"bytes":>9}')
+        for layout_name in args.layouts:
+            for window_count in [count for count in WINDOW_COUNTS if count <= args.max_windows]:
+                for result in Benchmark(server, args.rebuild == 'in-place').run(layout_name, window_count):
+                    print(result)
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+import json
+import os
+import re
+import socket
+import struct
+import tempfile
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from i3ipc import Connection
+from i3ipc._private import MessageType
+
+from i3l.mapper import WindowMapper
+
+MAGIC = b'i3-ipc'
+HEADER = struct.Struct('=II')
+EVENT_WINDOW = 0x80000003
+EVENT_TICK = 0x80000007
+WIDTH = 1280
+HEIGHT = 800
+OUTPUT_ID = 1000000
+CONTENT_ID = 1000001
+
+MARK_COMMAND = re.compile(r'^(?:\[con_id="?(\d+)"?] )?mark --add (\S+)$')
+UNMARK_COMMAND = re.compile(r'^(?:\[con_id="?(\d+)"?] )?unmark (\S+)$')
+FOCUS_COMMAND = re.compile(r'^\[con_id="?(\d+)"?] focus$')
+
+
+def rect(x: int, y: int, width: int, height: int) -> Dict[str, int]:
+    return {'x': x, 'y': y, 'width': width, 'height': height}
+
+
+class FakeTree:
+
+    def __init__(self, workspace_name: str = '1'):
+        self.workspace_name = workspace_name
+        self.windows: List[int] = []
+        self.marks: Dict[int, List[str]] = {}
+        self.focused: Optional[int] = None
+        self.window_ids: Dict[int, int] = {}
+        self._next_id = 1
+
+    def add_windows(self, count: int) -> List[int]:
+        con_ids = []
+        for _ in range(count):
+            self._next_id += 1
+            self.windows.append(self._next_id)
+            con_ids.append(self._next_id)
+        return con_ids
+
+    def restart(self):
+        # i3 gives new ids to the containers of the same X windows
+        window_ids = [self.window_id(con_id) for con_id in self.windows]
+        marks = [self.marks.pop(con_id, None) for con_id in self.windows]
+        self.windows = []
+        for con_id, window_id, con_marks in zip(self.add_windows(len(window_ids)), window_ids, marks):
+            self.window_ids[con_id] = window_id
+            if con_marks is not None:
+                self.marks[con_id] = con_marks
+        self.focused = None
+
+    def window_id(self, con_id: int) -> int:
+        return self.window_ids.get(con_id, 0x400000 + con_id)
+
+    def remove_window(self, con_id: int):
+        self.windows.remove(con_id)
+        self.marks.pop(con_id, None)
+
+    def window(self, con_id: int) -> Dict[str, Any]:
+        width = WIDTH // max(len(self.windows), 1)
+        index = self.windows.index(con_id) if con_id in self.windows else len(self.windows)
+        return {'id': con_id, 'type': 'con', 'window': self.window_id(con_id), 'name': f'window {con_id}',
+                'layout': 'splith', 'orientation': 'none', 'percent': 1 / max(len(self.windows), 1),
+                'floating': 'auto_off', 'focused': con_id == self.focused_id(), 'focus': [],
+                'marks': list(self.marks.get(con_id, [])), 'nodes': [], 'floating_nodes': [],
+                'rect': rect(index * width, 0, width, HEIGHT), 'geometry': rect(0, 0, width, HEIGHT),
+                'window_rect': rect(0, 0, width, HEIGHT), 'deco_rect': rect(0, 0, 0, 0)}
+
+    def focused_id(self) -> Optional[int]:
+        if self.focused in self.windows:
+            return self.focused
+        return self.windows[-1] if len(self.windows) > 0 else None
+
+    def workspace(self) -> Dict[str, Any]:
+        return {'id': 1, 'type': 'workspace', 'name': self.workspace_name, 'num': 1, 'layout': 'splith',
+                'orientation': 'horizontal', 'focused': len(self.windows) == 0, 'marks': [],
+                'focus': sorted(reversed(self.windows), key=lambda con_id: con_id != self.focused_id()),
+                'floating_nodes': [],
+                'nodes': [self.window(con_id) for con_id in self.windows], 'rect': rect(0, 0, WIDTH, HEIGHT)}
+
+    def tree(self) -> Dict[str, Any]:
+        content = {'id': CONTENT_ID, 'type': 'con', 'name': 'content', 'focus': [1], 'marks': [], 'floating_nodes': [],
+                   'nodes': [self.workspace()], 'rect': rect(0, 0, WIDTH, HEIGHT)}
+        output = {'id': OUTPUT_ID, 'type': 'output', 'name': 'fake', 'focus': [CONTENT_ID], 'marks': [],
+                  'floating_nodes': [], 'nodes': [content], 'rect': rect(0, 0, WIDTH, HEIGHT)}
+        return {'id': 0, 'type': 'root', 'name': 'root', 'focus': [OUTPUT_ID], 'marks': [], 'floating_nodes': [],
+                'nodes': [output], 'rect': rect(0, 0, WIDTH, HEIGHT)}
+
+    def workspaces(self) -> List[Dict[str, Any]]:
+        return [{'num': 1, 'name': self.workspace_name, 'visible': True, 'focused': True, 'urgent': False,
+                 'rect': rect(0, 0, WIDTH, HEIGHT), 'output': 'fake'}]
+
+    def run_command(self, command: str):
+        match = MARK_COMMAND.match(command)
+        con_id = (int(match.group(1)) if match.group(1) else self.focused_id()) if match is not None else None
+        if con_id in self.windows:
+            self.unmark(None, match.group(2))
+            self.marks.setdefault(con_id, []).append(match.group(2))
+            return
+        match = UNMARK_COMMAND.match(command)
+        if match is not None:
+            self.unmark(int(match.group(1)) if match.group(1) else None, match.group(2))
+            return
+        match = FOCUS_COMMAND.match(command)
+        if match is not None and int(match.group(1)) in self.windows:
+            self.focused = int(match.group(1))
+
+    def unmark(self, con_id: Optional[int], mark: str):
+        for marked_id, marks in self.marks.items():
+            if (con_id is None or con_id == marked_id) and mark in marks:
+                marks.remove(mark)
+
+
+class FakeI3Server:
+
+    def __init__(self, tree: FakeTree, config: str = ''):
+        self.tree = tree
+        self.config = config
+        self.socket_path = os.path.join(tempfile.mkdtemp(prefix='i3l-'), 'ipc.sock')
+        self.messages: Counter = Counter()
+        self.commands: List[str] = []
+        self.payloads: List[List[str]] = []
+        self.ticks: List[str] = []
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.subscribers: List[socket.socket] = []
+        self._lock = threading.Lock()
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    def start(self) -> 'FakeI3Server':
+        self._server.bind(self.socket_path)
+        self._server.listen()
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.close()
+        os.unlink(self.socket_path)
+        os.rmdir(os.path.dirname(self.socket_path))
+
+    def connect(self) -> Connection:
+        return Connection(self.socket_path)
+
+    def reset(self):
+        with self._lock:
+            self.messages = Counter()
+            self.commands = []
+            self.payloads = []
+            self.ticks = []
+            self.bytes_received = 0
+            self.bytes_sent = 0
+
+    def round_trips(self) -> int:
+        return sum(self.messages.values())
+
+    def emit(self, event_type: int, event: Dict[str, Any]):
+        data = json.dumps(event).encode('utf-8')
+        with self._lock:
+            subscribers = list(self.subscribers)
+        for client in subscribers:
+            client.sendall(MAGIC + HEADER.pack(len(data), event_type) + data)
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client: socket.socket):
+        with client:
+            while True:
+                header = self._receive(client, len(MAGIC) + HEADER.size)
+                if header is None:
+                    with self._lock:
+                        if client in self.subscribers:
+                            self.subscribers.remove(client)
+                    return
+                length, message_type = HEADER.unpack(header[len(MAGIC):])
+                payload = self._receive(client, length) if length > 0 else b''
+                reply = self._handle(MessageType(message_type), payload.decode('utf-8'))
+                data = json.dumps(reply).encode('utf-8')
+                with self._lock:
+                    self.bytes_received += len(header) + length
+                    self.bytes_sent += len(MAGIC) + HEADER.size + len(data)
+                client.sendall(MAGIC + HEADER.pack(len(data), message_type) + data)
+                if message_type == MessageType.SUBSCRIBE.value:
+                    self._subscribe(client, json.loads(payload.decode('utf-8')))
+
+    def _subscribe(self, client: socket.socket, events: List[str]):
+        with self._lock:
+            self.subscribers.append(client)
+        # i3 confirms a subscription to tick events with a first tick
+        if 'tick' in events:
+            data = json.dumps({'first': True, 'payload': ''}).encode('utf-8')
+            client.sendall(MAGIC + HEADER.pack(len(data), EVENT_TICK) + data)
+
+    @staticmethod
+    def _receive(client: socket.socket, size: int) -> Optional[bytes]:
+        data = b''
+        while len(data) < size:
+            chunk = client.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def _handle(self, message_type: MessageType, payload: str) -> Any:
+        with self._lock:
+            self.messages[message_type.name] += 1
+            if message_type == MessageType.COMMAND:
+                commands = [command.strip() for command in payload.split(';')]
+                self.commands.extend(commands)
+                self.payloads.append(commands)
+                for command in commands:
+                    self.tree.run_command(command)
+                return [{'success': True} for _ in commands]
+            if message_type == MessageType.GET_TREE:
+                return self.tree.tree()
+            if message_type == MessageType.GET_WORKSPACES:
+                return self.tree.workspaces()
+            if message_type == MessageType.GET_MARKS:
+                return [mark for marks in self.tree.marks.values() for mark in marks]
+            if message_type == MessageType.GET_CONFIG:
+                return {'config': self.config}
+            if message_type == MessageType.SEND_TICK:
+                self.ticks.append(payload)
+                return {'success': True}
+            if message_type == MessageType.GET_VERSION:
+                return {'major': 4, 'minor': 20, 'patch': 0, 'human_readable': '4.20 (fake)',
+                        'loaded_config_file_name': ''}
+            return {'success': True}
+
+
+class RecordingWindowMapper(WindowMapper):
+
+    def __init__(self):
+        self.operations: List[Tuple[str, int]] = []
+
+    def unmap(self, window_id: int):
+        self.operations.append(('unmap', window_id))
+
+    def map(self, window_id: int, x: int, y: int, width: int, height: int):
+        self.operations.append(('map', window_id))
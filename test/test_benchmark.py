@@ -0,0 +1,36 @@
+import unittest
+
+from test.benchmark import Benchmark
+from test.fake_i3 import FakeI3Server, FakeTree
+
+
+class TestBenchmark:
+
+    @classmethod
+    def setup_class(cls):
+        cls.server = FakeI3Server(FakeTree()).start()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.stop()
+
+    def test_fake_server_records_commands(self):
+        self.server.tree = FakeTree()
+        i3l = self.server.connect()
+        self.server.reset()
+        i3l.command('[con_id="2"] mark --add i3l:1:main; [con_id="2"] focus')
+        assert self.server.commands == ['[con_id="2"] mark --add i3l:1:main', '[con_id="2"] focus']
+        assert i3l.get_marks() == []
+        self.server.tree.add_windows(1)
+        i3l.command('[con_id="2"] mark --add i3l:1:main')
+        assert i3l.get_tree().find_marked('i3l:1:main')[0].id == 2
+        assert self.server.messages['COMMAND'] == 2
+
+    def test_benchmark_reports_every_event(self):
+        results = Benchmark(self.server).run('vstack', 5)
+        assert [result.event for result in results] == ['window_new', 'window_close', 'hstack']
+        assert all(result.round_trips > 0 and result.bytes > 0 for result in results)
+
+
+if __name__ == '__main__':
+    unittest.main()
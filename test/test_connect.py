@@ -0,0 +1,51 @@
+import threading
+import unittest
+
+from i3ipc import Event
+
+from i3l.connect import run_sync
+from test.fake_i3 import EVENT_WINDOW, FakeI3Server, FakeTree
+
+
+class TestRunSync:
+
+    def setup_method(self):
+        self.tree = FakeTree()
+        self.tree.add_windows(2)
+        self.server = FakeI3Server(self.tree).start()
+        self.i3l = self.server.connect()
+        self.handled = []
+        self.window_handled = threading.Event()
+        self.setup_started = threading.Event()
+        self.setup_released = threading.Event()
+
+    def teardown_method(self):
+        self.i3l.main_quit()
+        self.loop.join(5)
+        self.server.stop()
+
+    def _setup(self):
+        self.setup_started.set()
+        self.setup_released.wait(5)
+        # the setup talks to i3 while the events wait in the subscription socket
+        self.i3l.get_tree()
+        return [(Event.WINDOW_NEW, self._on_window_new)]
+
+    def _on_window_new(self, i3l, e):
+        self.handled.append(e.container.id)
+        self.window_handled.set()
+
+    def test_buffers_the_events_received_during_the_setup(self):
+        self.loop = threading.Thread(target=run_sync, args=(self.i3l, self._setup, None), daemon=True)
+        self.loop.start()
+        assert self.setup_started.wait(5)
+        self.server.emit(EVENT_WINDOW, {'change': 'new', 'container': self.tree.window(self.tree.windows[1])})
+        assert not self.window_handled.wait(0.1)
+        self.setup_released.set()
+        assert self.window_handled.wait(5)
+        assert self.handled == [self.tree.windows[1]]
+        assert self.server.messages['GET_TREE'] == 1
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import socket
+import unittest
+
+from i3l.control import ControlServer, send
+from i3l.handlers import on_control
+from i3l.layouts import Layouts
+from i3l.state import State
+from test.fake_i3 import FakeI3Server, FakeTree, RecordingWindowMapper
+
+
+class TestControlServer:
+
+    @classmethod
+    def setup_class(cls):
+        cls.tree = FakeTree()
+        cls.tree.add_windows(3)
+        cls.server = FakeI3Server(cls.tree, 'set $i3l vstack to workspace 1').start()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.stop()
+
+    def test_replies_to_each_request(self, tmp_path):
+        control = ControlServer(str(tmp_path / 'control.sock'))
+        control.start()
+        try:
+            assert send('vstack', control.path) == {'success': False, 'error': 'i3-layouts is starting'}
+            control.handler = lambda request: {'success': request != 'fail', 'request': request}
+            assert send('mark a; vstack', control.path) == {'success': True, 'request': 'mark a; vstack'}
+            control.handler = lambda request: {}[request]
+            assert not send('fail', control.path)['success']
+        finally:
+            control.close()
+        assert not os.path.exists(control.path)
+
+    def test_detects_a_running_server(self, tmp_path):
+        control = ControlServer(str(tmp_path / 'control.sock'))
+        assert not control.in_use()
+        control.start()
+        try:
+            assert ControlServer(control.path).in_use()
+        finally:
+            control.close()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+            stale.bind(control.path)
+        assert not control.in_use()
+        control.start()
+        control.close()
+
+    def test_runs_actions_against_i3(self, tmp_path):
+        i3l = self.server.connect()
+        layouts = Layouts.load(i3l.get_config())
+        window_mapper = RecordingWindowMapper()
+        state = State(i3l, window_mapper)
+        control = ControlServer(str(tmp_path / 'control.sock'))
+        control_handler = on_control(layouts, state)
+        control.handler = lambda request: control_handler(i3l, request)
+        control.start()
+        try:
+            self.server.reset()
+            reply = send('hstack', control.path)
+        finally:
+            control.close()
+        assert reply['success'] and reply['workspace'] == '1' and reply['layout'] == 'hstack'
+        assert layouts.get('1').name.value == 'hstack'
+        assert 'i3-layouts hstack' not in self.server.ticks
+        assert len(window_mapper.operations) > 0
+        assert control_handler(i3l, 'vstack; fullscreen') == {'success': False, 'error': 'unknown action: fullscreen'}
+        assert layouts.get('1').name.value == 'hstack'
+
+
+if __name__ == '__main__':
+    unittest.main()
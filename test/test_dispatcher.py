@@ -0,0 +1,58 @@
+import asyncio
+import unittest
+
+from i3ipc import Event
+from i3ipc.events import WindowEvent, TickEvent
+
+from i3l.dispatcher import EventDispatcher
+
+
+def window_event(change: str, con_id: int) -> WindowEvent:
+    container = {'id': con_id, 'type': 'con', 'window': con_id * 10, 'rect': {'x': 0, 'y': 0, 'width': 0, 'height': 0}}
+    return WindowEvent({'change': change, 'container': container}, None)
+
+
+def handle(i3l, e):
+    pass
+
+
+class TestEventDispatcher:
+
+    def test_keeps_last_focus_event(self):
+        events = [(handle, window_event('new', 1)), (handle, window_event('focus', 1)),
+                  (handle, window_event('new', 2)), (handle, window_event('focus', 2))]
+        coalesced_events = EventDispatcher.coalesce(events)
+        assert [(e.change, e.container.id) for _, e in coalesced_events] == [('new', 1), ('new', 2), ('focus', 2)]
+
+    def test_drops_focus_of_closed_window(self):
+        events = [(handle, window_event('focus', 1)), (handle, window_event('close', 1))]
+        coalesced_events = EventDispatcher.coalesce(events)
+        assert [(e.change, e.container.id) for _, e in coalesced_events] == [('close', 1)]
+
+    def test_keeps_other_events(self):
+        tick = TickEvent({'first': False, 'payload': 'i3-layouts swap'})
+        events = [(handle, tick), (handle, window_event('move', 1)), (handle, window_event('floating', 1))]
+        assert EventDispatcher.coalesce(events) == events
+
+    def test_buffers_events_until_setup_is_done(self):
+        handled = []
+        dispatcher = EventDispatcher(None)
+
+        def setup():
+            assert handled == []
+            return [(Event.WINDOW_NEW, lambda i3l, e: handled.append(e.container.id))]
+
+        async def run():
+            dispatcher._queue = asyncio.Queue()
+            dispatcher._queue.put_nowait((Event.WINDOW_NEW, window_event('new', 1)))
+            dispatcher._queue.put_nowait((Event.WINDOW_CLOSE, window_event('close', 1)))
+            worker = asyncio.ensure_future(dispatcher._work(None, setup))
+            await dispatcher._queue.join()
+            worker.cancel()
+
+        asyncio.run(run())
+        assert handled == [1]
+
+
+if __name__ == '__main__':
+    unittest.main()
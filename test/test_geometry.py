@@ -0,0 +1,114 @@
+import unittest
+from typing import List
+
+from pytest import approx
+
+from i3l.geometry import GeometryApplier, GeometryBuilder, Leaf, Split
+from i3l.layouts import Layouts
+from i3l.options import Direction
+from i3l.tree import LazyCon
+
+
+def con(con_id: int, layout: str = 'splith', nodes: List = None, percent: float = None, window: int = None,
+        con_type: str = 'con'):
+    return {'id': con_id, 'type': con_type, 'layout': layout, 'nodes': nodes or [], 'floating_nodes': [],
+            'percent': percent, 'window': window, 'marks': [], 'focus': [node['id'] for node in nodes or []],
+            'focused': False, 'rect': {'x': 0, 'y': 0, 'width': 0, 'height': 0}}
+
+
+def window(con_id: int, percent: float) -> dict:
+    return con(con_id, percent=percent, window=con_id * 10)
+
+
+class ContextStub:
+
+    def __init__(self, workspace):
+        self.workspace = workspace
+        self.commands = []
+
+    def exec(self, payload: str):
+        self.commands.append(payload)
+
+
+class TestGeometry:
+
+    def test_split_rects(self):
+        node = Split(Direction.HORIZONTAL, [Leaf(1, 0.6), Split.even(Direction.VERTICAL, [2, 3], 0.4)])
+        rects = node.rects(0, 0, 1000, 800)
+        assert rects[1] == (0, 0, 600, 800)
+        assert rects[2] == (600, 0, 400, 400)
+        assert rects[3] == (600, 400, 400, 400)
+
+    def test_vstack_geometry(self):
+        layout = Layouts.create('vstack', ['0.6', 'left'], '1')
+        rects = layout.geometry([1, 2, 3, 4]).rects(0, 0, 1000, 900)
+        assert rects[1] == (400, 0, 600, 900)
+        assert [rects[con_id][1] for con_id in [2, 3, 4]] == [0, 300, 600]
+        assert all(rects[con_id][2] == 400 for con_id in [2, 3, 4])
+
+    def test_spiral_geometry(self):
+        layout = Layouts.create('spiral', ['0.5', 'outside'], '1')
+        rects = layout.geometry([1, 2, 3, 4]).rects(0, 0, 800, 800)
+        assert rects[1] == (0, 0, 400, 800)
+        assert rects[2] == (400, 0, 400, 400)
+        assert rects[3] == (400, 400, 200, 400)
+        assert rects[4] == (600, 400, 200, 400)
+
+    def test_three_columns_geometry(self):
+        layout = Layouts.create('3columns', ['0.66', '0.5', '2', 'left'], '1')
+        two_columns = layout.geometry([1, 2]).rects(0, 0, 1000, 800)
+        assert two_columns[1][2] == approx(660, abs=1)
+        assert two_columns[2][0] == 0
+        rects = layout.geometry([1, 2, 3, 4]).rects(0, 0, 1000, 800)
+        assert rects[1] == (250, 0, 500, 800)
+        assert rects[2][0] == rects[3][0] == 0
+        assert rects[4] == (750, 0, 250, 800)
+
+    def test_companion_geometry(self):
+        layout = Layouts.create('companion', ['0.3', '0.4', 'up'], '1')
+        rects = layout.geometry([1, 2, 3]).rects(0, 0, 1000, 1000)
+        assert rects[2] == (0, 0, 500, 300)
+        assert rects[1] == (0, 300, 500, 700)
+        assert rects[3] == (500, 0, 500, 1000)
+
+    def test_apply_resizes_matching_tree(self):
+        workspace = con(1, 'splith', [window(2, 0.5), con(3, 'splitv', [window(4, 0.5), window(5, 0.5)], 0.5)],
+                        con_type='workspace')
+        context = ContextStub(LazyCon(workspace, None, None))
+        layout = Layouts.create('vstack', ['0.7'], '1')
+        assert GeometryApplier(context).apply(layout.geometry([2, 4, 5]), 'main', 'last')
+        assert context.commands == ['[con_id="2"] resize set width 70 ppt',
+                                    '[con_id="2"] mark --add main',
+                                    '[con_id="5"] mark --add last']
+
+    def test_apply_swaps_and_changes_orientation(self):
+        workspace = con(1, 'splith', [window(2, 0.5), con(3, 'splitv', [window(4, 0.5), window(5, 0.5)], 0.5)],
+                        con_type='workspace')
+        context = ContextStub(LazyCon(workspace, None, None))
+        layout = Layouts.create('hstack', ['0.5', 'down'], '1')
+        assert GeometryApplier(context).apply(layout.geometry([4, 2, 5]), 'main', 'last')
+        assert context.commands[:3] == ['[con_id="2"] swap container with con_id 4',
+                                        '[con_id="4"] layout splitv',
+                                        '[con_id="2"] layout splith']
+
+    def test_apply_rejects_different_shape(self):
+        workspace = con(1, 'splith', [window(2, 0.5), window(3, 0.5)], con_type='workspace')
+        context = ContextStub(LazyCon(workspace, None, None))
+        layout = Layouts.create('2columns', [], '1')
+        assert not GeometryApplier(context).apply(layout.geometry([2, 3, 4]), 'main', 'last')
+        assert context.commands == []
+
+    def test_build_moves_each_leaf_next_to_its_sibling(self):
+        layout = Layouts.create('vstack', ['0.5', 'left'], '1')
+        assert GeometryBuilder('anchor').commands(layout.geometry([1, 2, 3])) == [
+            '[con_id="2"] split horizontal',
+            '[con_id="2"] mark --add anchor',
+            '[con_id="1"] move window to mark anchor',
+            '[con_id="2"] split vertical',
+            '[con_id="2"] mark --add anchor',
+            '[con_id="3"] move window to mark anchor']
+        assert GeometryBuilder('anchor').commands(Leaf(1)) == []
+
+
+if __name__ == '__main__':
+    unittest.main()
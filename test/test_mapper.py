@@ -0,0 +1,40 @@
+import unittest
+from unittest.mock import Mock, call
+
+from i3l.mapper import XlibWindowMapper
+
+
+class TestXlibWindowMapper:
+
+    def test_unmaps_windows(self):
+        display = Mock()
+        mapper = XlibWindowMapper(display)
+        mapper.unmap(0x400001)
+        display.create_resource_object.assert_called_once_with('window', 0x400001)
+        window = display.create_resource_object.return_value
+        window.unmap.assert_called_once_with(onerror=mapper._on_error)
+        display.flush.assert_not_called()
+
+    def test_configures_windows_before_mapping_them(self):
+        display = Mock()
+        mapper = XlibWindowMapper(display)
+        mapper.map(0x400001, 10, 20, 300, 400)
+        window = display.create_resource_object.return_value
+        assert window.method_calls == [call.configure(x=10, y=20, width=300, height=400, onerror=mapper._on_error),
+                                       call.map(onerror=mapper._on_error)]
+        display.flush.assert_not_called()
+
+    def test_flushes_requests_once(self):
+        display = Mock()
+        mapper = XlibWindowMapper(display)
+        mapper.unmap(0x400001)
+        mapper.unmap(0x400002)
+        mapper.map(0x400001, 0, 0, 100, 100)
+        mapper.flush()
+        display.flush.assert_called_once_with()
+        assert [args for args, _ in display.create_resource_object.call_args_list] == \
+               [('window', 0x400001), ('window', 0x400002), ('window', 0x400001)]
+
+
+if __name__ == '__main__':
+    unittest.main()
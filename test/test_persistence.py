@@ -0,0 +1,68 @@
+import json
+import unittest
+
+from i3l.layouts import Layouts
+from i3l.persistence import StateStore
+from i3l.state import State
+from test.fake_i3 import FakeI3Server, FakeTree, RecordingWindowMapper
+
+
+class TestStateStore:
+
+    @classmethod
+    def setup_class(cls):
+        cls.tree = FakeTree()
+        cls.tree.add_windows(3)
+        cls.server = FakeI3Server(cls.tree, 'set $i3l vstack to workspace 1\nset $i3l spiral to workspace 2').start()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.stop()
+
+    def test_saves_overridden_layouts_and_windows_order(self, tmp_path):
+        i3l = self.server.connect()
+        layouts = Layouts.load(i3l.get_config())
+        layouts.add(Layouts.create('hstack', ['0.6'], '1'))
+        layouts.remove('2')
+        state = State(i3l, RecordingWindowMapper())
+        store = StateStore(str(tmp_path / 'state.json'), delay=60)
+        store.changed(layouts, state)
+        store.flush()
+        with open(tmp_path / 'state.json') as state_file:
+            snapshot = json.load(state_file)
+        assert snapshot['layouts'] == {'1': {'name': 'hstack', 'params': ['0.6', 'up']}, '2': None}
+        assert snapshot['sequences']['1']['windows'] == [0x400000 + con_id for con_id in self.tree.windows]
+
+    def test_restores_without_rebuilding(self, tmp_path):
+        i3l = self.server.connect()
+        layouts = Layouts.load(i3l.get_config())
+        state = State(i3l, RecordingWindowMapper())
+        state.context.workspace_sequence.switch_container_order(state.context.containers[0],
+                                                                state.context.containers[2])
+        state.context.workspace_sequence.set_stale(False)
+        store = StateStore(str(tmp_path / 'state.json'), delay=60)
+        store.changed(layouts, state)
+        store.flush()
+
+        self.server.reset()
+        restored_layouts = Layouts.load(i3l.get_config())
+        restored_state = State(i3l, RecordingWindowMapper())
+        StateStore(str(tmp_path / 'state.json')).restore(restored_layouts, restored_state)
+        workspace_sequence = restored_state.get_workspace_sequence('1')
+        assert workspace_sequence.con_ids() == state.get_workspace_sequence('1').con_ids()
+        assert not workspace_sequence.is_stale
+        assert restored_state.context.workspace_sequence is workspace_sequence
+        assert self.server.commands == []
+
+    def test_ignores_invalid_state(self, tmp_path):
+        i3l = self.server.connect()
+        layouts = Layouts.load(i3l.get_config())
+        state = State(i3l, RecordingWindowMapper())
+        with open(tmp_path / 'state.json', 'w') as state_file:
+            json.dump({'layouts': {'1': {'name': 'hstack'}}, 'sequences': {'1': {}}}, state_file)
+        StateStore(str(tmp_path / 'state.json')).restore(layouts, state)
+        assert layouts.get('1').name.value == 'vstack'
+
+
+if __name__ == '__main__':
+    unittest.main()
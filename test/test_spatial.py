@@ -0,0 +1,114 @@
+import unittest
+from typing import List, Optional
+
+from i3l.mover import Mover
+from i3l.spatial import AdjacencyGraph, SpatialIndex
+from i3l.tree import ContainerSnapshot, LazyCon
+
+
+def window(con_id: int, x: int, y: int, width: int, height: int) -> ContainerSnapshot:
+    rect = {'x': x, 'y': y, 'width': width, 'height': height}
+    return LazyCon({'id': con_id, 'type': 'con', 'window': con_id * 10, 'nodes': [], 'floating_nodes': [],
+                    'marks': [], 'focus': [], 'rect': rect, 'geometry': rect}, None, None).snapshot()
+
+
+class TestSpatialIndex:
+
+    def setup_method(self):
+        self.main = window(1, 0, 0, 600, 800)
+        self.top = window(2, 600, 0, 400, 400)
+        self.bottom = window(3, 600, 400, 400, 400)
+        self.index = SpatialIndex([self.main, self.top, self.bottom])
+
+    def test_nearest(self):
+        assert self.index.nearest('right', self.main).id == 2
+        assert self.index.nearest('left', self.bottom).id == 1
+        assert self.index.nearest('down', self.top).id == 3
+        assert self.index.nearest('up', self.top) is None
+
+    def test_corners(self):
+        corners = self.index.corners()
+        assert corners.top_left().id == 1
+        assert corners.bottom_left().id == 1
+        assert corners.top_right().id == 2
+        assert corners.bottom_right().id == 3
+
+    def test_lowest(self):
+        assert self.index.lowest([self.top, self.bottom]).id == 3
+        assert self.index.lowest([self.main, self.top]).id == 2
+        assert self.index.lowest([]) is None
+
+
+class TestAdjacencyGraph:
+
+    def test_neighbors(self):
+        containers = [window(1, 0, 0, 600, 800), window(2, 600, 0, 400, 400), window(3, 600, 400, 400, 400)]
+        graph = AdjacencyGraph.create(SpatialIndex(containers))
+        assert graph.neighbor(1, 'right') == 2
+        assert graph.neighbor(3, 'left') == 1
+        assert graph.neighbor(2, 'down') == 3
+        assert graph.neighbor(3, 'up') == 2
+        assert graph.neighbor(1, 'left') is None
+
+    def test_swap_matches_new_graph(self):
+        containers = [window(1, 0, 0, 600, 800), window(2, 600, 0, 400, 400), window(3, 600, 400, 400, 400)]
+        graph = AdjacencyGraph.create(SpatialIndex(containers))
+        graph.swap(1, 3)
+        swapped = AdjacencyGraph.create(SpatialIndex([window(3, 0, 0, 600, 800), window(2, 600, 0, 400, 400),
+                                                      window(1, 600, 400, 400, 400)]))
+        for con_id in [1, 2, 3]:
+            for direction in ['left', 'right', 'up', 'down']:
+                assert graph.neighbor(con_id, direction) == swapped.neighbor(con_id, direction)
+
+
+class ContextStub:
+
+    def __init__(self, containers: List[ContainerSnapshot], focused: ContainerSnapshot):
+        self.containers = containers
+        self.focused = focused
+        self.commands = []
+
+    def find_container(self, con_id: Optional[int]) -> Optional[ContainerSnapshot]:
+        return next((container for container in self.containers if container.id == con_id), None)
+
+    def spatial_index(self) -> SpatialIndex:
+        return SpatialIndex(self.containers)
+
+    def exec(self, payload: str):
+        self.commands.append(payload)
+
+
+class TestMover:
+
+    def setup_method(self):
+        self.containers = [window(1, 0, 0, 600, 800), window(2, 600, 0, 400, 400), window(3, 600, 400, 400, 400)]
+        self.graph = AdjacencyGraph.create(SpatialIndex(self.containers))
+
+    def test_focuses_the_graph_neighbor(self):
+        context = ContextStub(self.containers, self.containers[2])
+        Mover(context, self.graph).focus_direction('left')
+        assert context.commands == ['[con_id="1"] focus']
+
+    def test_searches_containers_missing_from_the_graph(self):
+        floating = window(4, 100, 100, 200, 200)
+        context = ContextStub(self.containers, floating)
+        assert not self.graph.contains(4)
+        Mover(context, self.graph).focus_direction('right')
+        assert context.commands == ['[con_id="2"] focus']
+
+    def test_searches_neighbors_missing_from_the_context(self):
+        context = ContextStub([container for container in self.containers if container.id != 1], self.containers[2])
+        Mover(context, self.graph).focus_direction('up')
+        assert context.commands == ['[con_id="2"] focus']
+        context.commands = []
+        Mover(context, self.graph).focus_direction('left')
+        assert context.commands == ['focus left']
+
+    def test_graph_contains_containers_without_neighbors(self):
+        graph = AdjacencyGraph.create(SpatialIndex([window(1, 0, 0, 1000, 800)]))
+        assert graph.contains(1)
+        assert graph.neighbor(1, 'left') is None
+
+
+if __name__ == '__main__':
+    unittest.main()
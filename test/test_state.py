@@ -0,0 +1,283 @@
+import unittest
+from typing import List
+
+from i3ipc import Connection
+
+from i3l.layouts import Layouts
+from i3l.state import Context, FocusHistory, InPlaceRebuild, RebuildAction, RebuildCause, State, WorkspaceSequence
+from i3l.tree import LazyCon, Rectangle, TreeCache
+from test.fake_i3 import FakeI3Server, FakeTree, RecordingWindowMapper
+
+
+def window(con_id: int) -> LazyCon:
+    return LazyCon({'id': con_id, 'type': 'con', 'window': con_id * 10, 'nodes': [], 'floating_nodes': [],
+                    'marks': [], 'focus': [], 'rect': {'x': 0, 'y': 0, 'width': 100, 'height': 100},
+                    'geometry': {'x': 0, 'y': 0, 'width': 100, 'height': 100}}, None, None)
+
+
+class ContextStub:
+
+    def __init__(self, containers: List[LazyCon]):
+        self.containers = containers
+        self.workspace_sequence = WorkspaceSequence()
+        for container in containers:
+            self.workspace_sequence.set_order(container)
+        self.commands = []
+        self.mapped = []
+        self.unmapped = []
+
+    def sorted_containers(self) -> List[LazyCon]:
+        return sorted(self.containers, key=lambda container: self.workspace_sequence.get_order(container.id))
+
+    def exec(self, payload: str):
+        self.commands.append(payload)
+
+    def mark(self, con_id: int, mark: str):
+        self.commands.append(f'[con_id="{con_id}"] mark --add {mark}')
+
+    def unmap_window(self, window_id: int):
+        self.unmapped.append(window_id)
+
+    def map_windows(self, rebuild_containers):
+        self.mapped.append([rebuild_container.window for rebuild_container in rebuild_containers])
+
+
+class ConnectionLog:
+
+    def __init__(self, i3l: Connection):
+        self.i3l = i3l
+        self.log = []
+
+    def command(self, payload: str):
+        self.log.append(('command', payload))
+        return self.i3l.command(payload)
+
+    def send_tick(self, payload: str):
+        self.log.append(('tick', payload))
+        return self.i3l.send_tick(payload)
+
+    def _message(self, message_type, payload: str):
+        self.log.append(('message', message_type.name))
+        return self.i3l._message(message_type, payload)
+
+
+class TestContextBatch:
+
+    @classmethod
+    def setup_class(cls):
+        cls.tree = FakeTree()
+        cls.tree.add_windows(2)
+        cls.server = FakeI3Server(cls.tree).start()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.stop()
+
+    def _context(self) -> Context:
+        connection = ConnectionLog(self.server.connect())
+        tree_cache = TreeCache()
+        tree_cache.refresh(connection)
+        connection.log = []
+        return Context(connection, tree_cache, None, RecordingWindowMapper())
+
+    def test_sends_batched_commands_in_order(self):
+        context = self._context()
+        with context.batch():
+            context.exec('nop a')
+            context.mark(2, 'b')
+            context.exec('nop c')
+            assert context.i3l.log == []
+        assert context.i3l.log == [('command', 'nop a; [con_id="2"] mark --add b; nop c')]
+
+    def test_flushes_nested_batches_with_the_outer_one(self):
+        context = self._context()
+        with context.batch():
+            context.exec('nop a')
+            with context.batch():
+                context.exec('nop b')
+            assert context.i3l.log == []
+            context.exec('nop c')
+        assert context.i3l.log == [('command', 'nop a; nop b; nop c')]
+
+    def test_flushes_before_tick_resync_and_unmap(self):
+        context = self._context()
+        with context.batch():
+            context.exec('nop a')
+            context.send_tick('tick')
+            context.exec('nop b')
+            context.resync()
+            context.exec('nop c')
+            context.unmap_window(42)
+            assert context.i3l.log[-1] == ('command', 'nop c')
+            assert context.window_mapper.operations == [('unmap', 42)]
+            context.exec('nop d')
+        assert context.i3l.log == [('command', 'nop a'), ('tick', 'tick'),
+                                   ('command', 'nop b'), ('message', 'GET_TREE'),
+                                   ('command', 'nop c'),
+                                   ('command', 'nop d')]
+
+    def test_sends_commands_outside_batches(self):
+        context = self._context()
+        context.exec('nop a')
+        context.exec('nop b')
+        assert context.flush() == []
+        assert context.i3l.log == [('command', 'nop a'), ('command', 'nop b')]
+
+
+class TestRebuildAction:
+
+    def test_maps_windows_by_batch(self):
+        context = ContextStub([window(con_id) for con_id in [1, 2, 3, 4, 5]])
+        rebuild_action = RebuildAction(2)
+        rebuild_action.start_rebuild(context, RebuildCause.WINDOW_CLOSE, 'main', 'last', 2)
+        assert context.unmapped == [20, 30, 40, 50]
+        assert context.mapped == [[20, 30]]
+        assert not rebuild_action.container_rebuilt(context, context.containers[1])
+        assert rebuild_action.container_rebuilt(context, context.containers[2])
+        rebuild_action.next_rebuild(context)
+        assert context.mapped == [[20, 30], [40, 50]]
+        assert context.commands == []
+
+    def test_reorders_batch_reported_out_of_order(self):
+        context = ContextStub([window(con_id) for con_id in [1, 2, 3]])
+        rebuild_action = RebuildAction(3)
+        rebuild_action.start_rebuild(context, RebuildCause.WINDOW_CLOSE, 'main', 'last', 1)
+        for con_id in [3, 1, 2]:
+            context.workspace_sequence.set_order(context.containers[con_id - 1])
+            rebuild_action.container_rebuilt(context, context.containers[con_id - 1])
+        assert context.commands == ['[con_id="3"] swap container with con_id 1',
+                                    '[con_id="3"] swap container with con_id 2',
+                                    '[con_id="1"] mark --add main',
+                                    '[con_id="3"] mark --add last']
+        assert [container.id for container in context.sorted_containers()] == [1, 2, 3]
+
+
+class TestInPlaceRebuild:
+
+    @classmethod
+    def setup_class(cls):
+        cls.tree = FakeTree()
+        cls.tree.add_windows(6)
+        cls.server = FakeI3Server(cls.tree).start()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.stop()
+
+    def test_rebuilds_in_a_bounded_number_of_messages(self):
+        i3l = self.server.connect()
+        self.tree.focused = None
+        state = State(i3l, RecordingWindowMapper(), rebuild_in_place=True)
+        context = state.context
+        layout = Layouts.create('vstack', [], self.tree.workspace_name)
+        self.server.reset()
+        state.start_rebuild(RebuildCause.WINDOW_CLOSE, context, layout)
+        first_id, other_ids = self.tree.windows[0], self.tree.windows[1:]
+        assert self.server.messages['GET_TREE'] == 1
+        assert self.server.payloads[0] == [f'[con_id="{con_id}"] move container to workspace '
+                                           f'{InPlaceRebuild.PARKING_WORKSPACE}' for con_id in other_ids]
+        moved_ids = [int(command.split('"')[1]) for command in self.server.payloads[1] if 'move window' in command]
+        assert moved_ids == other_ids
+        assert self.server.payloads[1][-3:] == [f'[con_id="{first_id}"] mark --add {layout.mark_main()}',
+                                                f'[con_id="{other_ids[-1]}"] mark --add {layout.mark_last()}',
+                                                f'[con_id="{other_ids[-1]}"] focus']
+        assert state.context is context
+        assert [container.id for container in context.containers] == self.tree.windows
+        assert state.rebuild_action.containers_to_close == []
+
+
+class TestWorkspaceSequence:
+
+    def test_keeps_containers_in_order(self):
+        sequence = WorkspaceSequence()
+        containers = [window(con_id) for con_id in [1, 2, 3, 4]]
+        for container in containers:
+            sequence.set_order(container)
+        sequence.switch_container_order(containers[0], containers[2])
+        sequence.set_order(containers[1])
+        assert sequence.con_ids() == [3, 1, 4, 2]
+        assert sequence.con_ids_after(4) == [4, 2]
+
+    def test_removes_closed_containers(self):
+        sequence = WorkspaceSequence()
+        for con_id in [1, 2, 3]:
+            sequence.set_order(window(con_id))
+        sequence.set_stale(True, 2)
+        sequence.remove(2)
+        assert sequence.con_ids() == [1, 3]
+        assert not sequence.contains(2)
+        assert sequence.stale_con_id == 3
+        assert len(sequence) == 2
+
+    def test_realiases_containers_by_window(self):
+        sequence = WorkspaceSequence()
+        for con_id in [1, 2, 3]:
+            sequence.set_order(window(con_id))
+        sequence.switch_container_order(window(1), window(3))
+        restarted = [window(con_id) for con_id in [1, 2, 3]]
+        for index, container in enumerate(restarted):
+            container.id = 10 + index
+        assert all(sequence.alias(container) for container in restarted)
+        assert sequence.con_ids() == [12, 11, 10]
+        assert sequence.windows() == [30, 20, 10]
+        assert not sequence.contains(1)
+        sequence.remove(99, 20)
+        assert sequence.con_ids() == [12, 10]
+
+    def test_replaces_every_alias_after_a_restart(self):
+        sequence = WorkspaceSequence()
+        for con_id in [1, 2, 3]:
+            sequence.set_order(window(con_id))
+        sequence.set_stale(True, 2)
+        restarted = [window(con_id) for con_id in [1, 3]]
+        for index, container in enumerate(restarted):
+            container.id = 2 - index
+        sequence.realias(restarted)
+        assert sequence.windows() == [10, 30]
+        assert sequence.con_ids() == [2, 1]
+        assert sequence.stale_con_id == 1
+
+    def test_removes_by_window_before_stale_alias(self):
+        sequence = WorkspaceSequence()
+        sequence.set_order(window(1))
+        sequence.remove(1, 99)
+        assert sequence.windows() == [10]
+        sequence.remove(1)
+        assert sequence.windows() == []
+
+
+class TestContainerSnapshot:
+
+    def test_snapshots_descendants(self):
+        split = window(2)
+        split.ipc_data['nodes'] = [window(3).ipc_data, window(4).ipc_data]
+        workspace = LazyCon(dict(window(1).ipc_data, type='workspace', nodes=[split.ipc_data]), None, None)
+        snapshots = workspace.descendant_snapshots()
+        assert [(snapshot.id, snapshot.parent_id) for snapshot in snapshots] == [(2, 1), (3, 2), (4, 2)]
+        assert snapshots[1].geometry == Rectangle(0, 0, 100, 100)
+        assert snapshots[1].rect.width == 100
+
+
+class TestFocusHistory:
+
+    def test_ignores_unchanged_focus(self):
+        focus_history = FocusHistory()
+        assert focus_history.focus(1)
+        assert focus_history.focus(2)
+        assert not focus_history.focus(2)
+        assert (focus_history.previous_id, focus_history.current_id) == (1, 2)
+
+    def test_ignores_expected_focus(self):
+        focus_history = FocusHistory()
+        focus_history.focus(1)
+        focus_history.focus(2)
+        focus_history.expect([3, 4, 2])
+        assert not focus_history.focus(3)
+        assert not focus_history.focus(2)
+        assert (focus_history.previous_id, focus_history.current_id) == (1, 2)
+        assert focus_history.focus(4)
+        assert (focus_history.previous_id, focus_history.current_id) == (2, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
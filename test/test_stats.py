@@ -0,0 +1,46 @@
+import os
+import unittest
+
+from i3l.stats import Histogram, Stats
+
+
+class TestStats:
+
+    def test_histogram_percentiles(self):
+        histogram = Histogram()
+        for value in [0.5, 3, 3, 4, 150]:
+            histogram.add(value)
+        assert histogram.count == 5
+        assert histogram.percentile(0.5) == 5
+        assert histogram.percentile(1.0) == 200
+        assert histogram.max == 150
+
+    def test_counts_are_attributed_to_outermost_event(self):
+        stats = Stats()
+        stats.enabled = True
+        with stats.event('window_new', lambda: 'vstack'):
+            stats.count_tree()
+            with stats.event('window_close', lambda: 'vstack'):
+                stats.count_command()
+                stats.count_command_message()
+        stats.count_tree()
+        event_stats = stats.events[('window_new', 'vstack')]
+        assert (event_stats.latency.count, event_stats.trees, event_stats.commands) == (1, 1, 1)
+        assert list(stats.events) == [('window_new', 'vstack')]
+
+    def test_disabled_stats_record_nothing(self):
+        stats = Stats()
+        with stats.event('window_new', lambda: 'vstack'):
+            stats.count_tree()
+        assert stats.events == {}
+
+    def test_writes_only_in_runtime_directory(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+        Stats().write('../../stats.txt', ['workspace sequences: 1'])
+        assert not os.path.exists(tmp_path / 'stats.txt')
+        with open(tmp_path / 'i3-layouts' / 'stats.txt') as stats_file:
+            assert stats_file.read() == 'workspace sequences: 1\n'
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from i3ipc import TickEvent
+
+from i3l.handlers import on_tick
+from i3l.layouts import Layouts
+from i3l.state import State
+from test.fake_i3 import FakeI3Server, FakeTree, RecordingWindowMapper
+
+
+class TestTickPipeline:
+
+    @classmethod
+    def setup_class(cls):
+        cls.tree = FakeTree()
+        cls.tree.add_windows(3)
+        cls.server = FakeI3Server(cls.tree, 'set $i3l vstack to workspace 1').start()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.stop()
+
+    def _tick(self, payload: str):
+        i3l = self.server.connect()
+        layouts = Layouts.load(i3l.get_config())
+        self.tree.focused = None
+        self.window_mapper = RecordingWindowMapper()
+        state = State(i3l, self.window_mapper)
+        self.server.reset()
+        on_tick(layouts, state)(i3l, TickEvent({'first': False, 'payload': payload}))
+
+    def test_actions_share_one_tree(self):
+        focused_id = self.tree.windows[-1]
+        self._tick('i3-layouts mark first; mark second ;focus left')
+        assert self.server.messages['GET_TREE'] == 1
+        assert self.server.messages['COMMAND'] == 1
+        assert self.server.commands == [f'[con_id="{focused_id}"] mark --add first',
+                                        f'[con_id="{focused_id}"] mark --add second',
+                                        f'[con_id="{self.tree.windows[-2]}"] focus']
+
+    def test_resyncs_after_tree_change(self):
+        self._tick('i3-layouts move left; mark moved')
+        assert self.server.messages['GET_TREE'] == 2
+        assert self.server.commands[-1] == f'[con_id="{self.tree.focused_id()}"] mark --add moved'
+
+    def test_resyncs_focus_changed_by_previous_action(self):
+        self._tick('i3-layouts focus left; mark target')
+        assert self.tree.focused_id() == self.tree.windows[-2]
+        assert self.server.commands == [f'[con_id="{self.tree.windows[-2]}"] focus',
+                                        f'[con_id="{self.tree.windows[-2]}"] mark --add target']
+
+    def test_resyncs_after_windows_unmapped_by_a_rebuild(self):
+        self._tick('i3-layouts hstack; mark target')
+        assert ('unmap', self.tree.window_id(self.tree.windows[0])) in self.window_mapper.operations
+        assert self.server.messages['GET_TREE'] == 2
+
+
+if __name__ == '__main__':
+    unittest.main()
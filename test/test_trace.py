@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+from typing import List
+
+from i3ipc import Event
+from i3ipc.events import WindowEvent
+
+from i3l.handlers import on_control, subscriptions
+from i3l.layouts import Layouts
+from i3l.state import State
+from i3l.trace import RecordingConnection, TracePlayer, TraceRecorder
+from test.fake_i3 import FakeI3Server, FakeTree, RecordingWindowMapper
+
+
+class TestTrace:
+
+    @staticmethod
+    def _record(path: str, killed_path: str = None, control_request: str = None) -> List[str]:
+        tree = FakeTree()
+        tree.add_windows(3)
+        server = FakeI3Server(tree, 'set $i3l vstack to workspace 1').start()
+        try:
+            recorder = TraceRecorder(path)
+            recorder.start({'rebuild': 'remap'})
+            i3l = RecordingConnection(recorder, server.socket_path)
+            layouts = Layouts.load(i3l.get_config())
+            state = State(i3l, RecordingWindowMapper())
+            handlers = dict(subscriptions(layouts, state))
+            server.reset()
+            if control_request is not None:
+                recorder.wrap_control(on_control(layouts, state))(i3l, control_request)
+            con_id = tree.add_windows(1)[0]
+            event = WindowEvent({'change': 'new', 'container': tree.window(con_id)}, i3l)
+            recorder.wrap(Event.WINDOW_NEW, handlers[Event.WINDOW_NEW])(i3l, event)
+            recorded_commands = list(server.commands)
+            if killed_path is not None:
+                shutil.copyfile(path, killed_path)
+            recorder.close()
+        finally:
+            server.stop()
+        return recorded_commands
+
+    def test_replays_recorded_events(self):
+        path = os.path.join(tempfile.mkdtemp(), 'trace.jsonl.gz')
+        recorded_commands = self._record(path)
+        player = TracePlayer.load(path)
+        assert len(recorded_commands) > 0
+        assert player.play() == 1
+        assert player.i3l.missing_replies == 0
+        assert player.i3l.replayed_commands == recorded_commands
+
+    def test_replays_trace_of_killed_daemon(self):
+        directory = tempfile.mkdtemp()
+        killed_path = os.path.join(directory, 'killed.jsonl.gz')
+        recorded_commands = self._record(os.path.join(directory, 'trace.jsonl.gz'), killed_path)
+        player = TracePlayer.load(killed_path)
+        assert player.play() == 1
+        assert player.i3l.missing_replies == 0
+        assert player.i3l.replayed_commands == recorded_commands
+
+    def test_replays_control_requests(self):
+        path = os.path.join(tempfile.mkdtemp(), 'trace.jsonl')
+        recorded_commands = self._record(path, control_request='hstack; mark target')
+        player = TracePlayer.load(path)
+        assert player.play() == 2
+        assert player.i3l.missing_replies == 0
+        assert player.i3l.replayed_commands == recorded_commands
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+import time
+import unittest
+
+from i3ipc import Con
+from i3ipc.events import BindingEvent, WindowEvent
+
+from i3l.handlers import on_binding, on_window_focus
+from i3l.layouts import Layouts
+from i3l.state import State
+from i3l.tree import LazyCon, TreeCache
+from test.fake_i3 import FakeI3Server, FakeTree, RecordingWindowMapper
+
+
+def binding(command: str) -> BindingEvent:
+    return BindingEvent({'change': 'run', 'binding': {'command': command, 'input_code': 0, 'input_type': 'keyboard',
+                                                      'symbol': 'r', 'event_state_mask': ['Mod4']}})
+
+
+def tree_cache(tree: FakeTree, reconcile_interval: float = 30.0) -> TreeCache:
+    cache = TreeCache(reconcile_interval)
+    cache.tree = LazyCon(tree.tree(), None, None)
+    cache._synced_at = time.monotonic()
+    return cache
+
+
+class TestTreeCache:
+
+    def setup_method(self):
+        self.tree = FakeTree()
+        self.tree.add_windows(3)
+
+    def test_expires_after_the_reconcile_interval(self):
+        assert not TreeCache().is_valid()
+        assert tree_cache(self.tree).is_valid()
+        cache = tree_cache(self.tree, 30.0)
+        cache._synced_at -= 31.0
+        assert not cache.is_valid()
+        cache = tree_cache(self.tree)
+        cache.invalidate()
+        assert not cache.is_valid()
+
+    def test_moves_the_focus(self):
+        cache = tree_cache(self.tree)
+        first_id = self.tree.windows[0]
+        assert cache.focus(LazyCon(self.tree.window(first_id), None, None))
+        assert cache.tree.find_focused().id == first_id
+        workspace = cache.tree.ipc_data['nodes'][0]['nodes'][0]['nodes'][0]
+        assert workspace['focus'][0] == first_id
+        assert sum(1 for node in TreeCache.walk(cache.tree.ipc_data) if node.get('focused')) == 1
+
+    def test_rejects_containers_missing_or_diverged(self):
+        cache = tree_cache(self.tree)
+        assert not cache.focus(LazyCon(self.tree.window(99), None, None))
+        diverged = LazyCon(dict(self.tree.window(self.tree.windows[0]), window=1), None, None)
+        assert not cache.focus(diverged)
+        cache.invalidate()
+        assert not cache.focus(LazyCon(self.tree.window(self.tree.windows[0]), None, None))
+
+    def test_moves_unique_marks(self):
+        cache = tree_cache(self.tree)
+        first_id, second_id, _ = self.tree.windows
+        cache.mark(first_id, 'a')
+        cache.mark(first_id, 'b')
+        cache.mark(second_id, 'a')
+        assert [con.id for con in cache.tree.find_marked('a')] == [second_id]
+        assert [con.id for con in cache.tree.find_marked('b')] == [first_id]
+        cache.unmark('b', second_id)
+        assert [con.id for con in cache.tree.find_marked('b')] == [first_id]
+        cache.unmark('b')
+        assert cache.tree.find_marked('b') == []
+
+
+class TestLazyCon:
+
+    def setup_method(self):
+        self.tree = FakeTree()
+        self.tree.add_windows(3)
+        self.tree.marks[self.tree.windows[1]] = ['a']
+
+    def test_builds_nodes_on_access(self):
+        root = LazyCon(self.tree.tree(), None, None)
+        assert root._nodes is None and root._floating_nodes is None
+        output = root.nodes[0]
+        assert isinstance(output, LazyCon) and output.parent is root
+        assert output._nodes is None
+        assert root.nodes[0] is output
+        assert [con.id for con in root.workspaces()[0].nodes] == self.tree.windows
+
+    def test_snapshots_the_fields_of_con(self):
+        workspace = LazyCon(self.tree.tree(), None, None).workspaces()[0]
+        con_fields = ['id', 'window', 'type', 'floating', 'marks', 'layout', 'orientation', 'percent']
+        cons = Con(self.tree.tree(), None, None).workspaces()[0].nodes
+        for snapshot, con in zip(workspace.descendant_snapshots(), cons):
+            assert [getattr(snapshot, field) for field in con_fields] == [getattr(con, field) for field in con_fields]
+            assert tuple(snapshot.rect) == (con.rect.x, con.rect.y, con.rect.width, con.rect.height)
+            assert tuple(snapshot.geometry) == (con.geometry.x, con.geometry.y, con.geometry.width,
+                                                con.geometry.height)
+            assert snapshot.parent_id == con.parent.id
+        lazy_con = workspace.nodes[1]
+        assert [getattr(lazy_con.snapshot(), field) for field in con_fields] == \
+               [getattr(cons[1], field) for field in con_fields]
+        assert lazy_con.snapshot().parent_id == workspace.id
+
+
+class TestSyncFocusContext:
+
+    @classmethod
+    def setup_class(cls):
+        cls.tree = FakeTree()
+        cls.tree.add_windows(3)
+        cls.server = FakeI3Server(cls.tree).start()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.stop()
+
+    def test_focuses_the_cached_tree(self):
+        i3l = self.server.connect()
+        self.tree.focused = None
+        state = State(i3l, RecordingWindowMapper())
+        self.server.reset()
+        self.tree.focused = self.tree.windows[0]
+        context = state.sync_focus_context(i3l, LazyCon(self.tree.window(self.tree.windows[0]), None, None))
+        assert self.server.messages['GET_TREE'] == 0
+        assert context.focused.id == self.tree.windows[0]
+        assert state.context is context
+
+    def test_fetches_the_tree_when_the_cache_is_invalid(self):
+        i3l = self.server.connect()
+        self.tree.focused = None
+        state = State(i3l, RecordingWindowMapper())
+        self.server.reset()
+        state.tree_cache.invalidate()
+        self.tree.focused = self.tree.windows[1]
+        context = state.sync_focus_context(i3l, LazyCon(self.tree.window(self.tree.windows[1]), None, None))
+        assert self.server.messages['GET_TREE'] == 1
+        assert context.focused.id == self.tree.windows[1]
+
+
+class TestAutosplitFocus:
+
+    @classmethod
+    def setup_class(cls):
+        cls.tree = FakeTree()
+        cls.tree.add_windows(3)
+        cls.server = FakeI3Server(cls.tree, 'set $i3l autosplit to workspace 1').start()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.stop()
+
+    def setup_method(self):
+        self.i3l = self.server.connect()
+        self.layouts = Layouts.load(self.i3l.get_config())
+        self.tree.focused = None
+        self.state = State(self.i3l, RecordingWindowMapper())
+        self.server.reset()
+
+    def _focus(self, con_id: int):
+        self.tree.focused = con_id
+        event = WindowEvent({'change': 'focus', 'container': self.tree.window(con_id)}, self.i3l)
+        on_window_focus(self.layouts, self.state)(self.i3l, event)
+
+    def test_keeps_the_tree_after_splits_and_marks(self):
+        for con_id in [self.tree.windows[0], self.tree.windows[1], self.tree.windows[2]]:
+            self._focus(con_id)
+        assert self.server.messages['GET_TREE'] == 0
+        assert self.server.messages['COMMAND'] == 3
+        assert self.state.tree_cache.tree.find_marked('i3l:1:last')[0].id == self.tree.windows[2]
+
+    def test_fetches_the_tree_after_a_resize_binding(self):
+        self._focus(self.tree.windows[0])
+        on_binding(self.layouts, self.state)(self.i3l, binding('focus left'))
+        self._focus(self.tree.windows[1])
+        assert self.server.messages['GET_TREE'] == 0
+        on_binding(self.layouts, self.state)(self.i3l, binding('mode default; resize grow width 10 px or 10 ppt'))
+        self._focus(self.tree.windows[2])
+        assert self.server.messages['GET_TREE'] == 1
+
+
+if __name__ == '__main__':
+    unittest.main()
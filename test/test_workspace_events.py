@@ -0,0 +1,105 @@
+import unittest
+
+from i3ipc import TickEvent
+from i3ipc.events import ShutdownEvent, WorkspaceEvent
+
+from i3l.handlers import on_shutdown, on_tick, on_workspace_empty, on_workspace_reload, on_workspace_rename
+from i3l.layouts import Layouts
+from i3l.state import State
+from test.fake_i3 import FakeI3Server, FakeTree, RecordingWindowMapper
+
+
+class TestWorkspaceEvents:
+
+    @classmethod
+    def setup_class(cls):
+        cls.tree = FakeTree()
+        cls.tree.add_windows(2)
+        cls.server = FakeI3Server(cls.tree, 'set $i3l vstack to workspace 1').start()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.stop()
+
+    def _event(self, change: str, name: str) -> WorkspaceEvent:
+        workspace = dict(self.tree.workspace(), name=name)
+        return WorkspaceEvent({'change': change, 'current': workspace}, None)
+
+    def test_rename_moves_workspace_state(self):
+        i3l = self.server.connect()
+        layouts = Layouts.load(i3l.get_config())
+        state = State(i3l, RecordingWindowMapper())
+        main_id, last_id = self.tree.windows[0], self.tree.windows[-1]
+        self.tree.marks = {main_id: ['i3l:1:main'], last_id: ['i3l:1:last']}
+        self.server.reset()
+        try:
+            on_workspace_rename(layouts, state)(i3l, self._event('rename', 'web'))
+        finally:
+            self.tree.marks = {}
+        assert layouts.get('web').mark_main() == 'i3l:web:main'
+        assert layouts.get('1').mark_main() == 'i3l:1:main'
+        assert 'web' in state.workspace_sequences and '1' not in state.workspace_sequences
+        assert self.server.messages['COMMAND'] == 1
+        assert self.server.commands == [f'[con_id="{main_id}"] mark --add i3l:web:main',
+                                        f'[con_id="{last_id}"] mark --add i3l:web:last']
+        assert state.tree_cache.tree.find_marked_ids('i3l:web:last') == [last_id]
+
+    def test_empty_drops_dynamic_layout(self):
+        i3l = self.server.connect()
+        layouts = Layouts.load(i3l.get_config())
+        layouts.add(Layouts.create('spiral', [], '2'))
+        layouts.add(Layouts.create('hstack', [], '1'))
+        state = State(i3l, RecordingWindowMapper())
+        on_workspace_empty(layouts, state)(i3l, self._event('empty', '2'))
+        on_workspace_empty(layouts, state)(i3l, self._event('empty', '1'))
+        assert not layouts.exists_for('2')
+        assert layouts.get('1').name.value == 'vstack'
+        assert state.workspace_sequences == {}
+
+    def test_reload_applies_changed_layouts(self):
+        i3l = self.server.connect()
+        layouts = Layouts.load(i3l.get_config())
+        layouts.add(Layouts.create('spiral', [], '3'))
+        state = State(i3l, RecordingWindowMapper())
+        self.server.reset()
+        on_workspace_reload(layouts, state)(i3l, WorkspaceEvent({'change': 'reload'}, None))
+        assert self.server.commands == []
+        self.server.config = 'set $i3l hstack to workspace 1\nset $i3l 2columns to workspace 2\n' \
+                             'set $i3l vstack to workspace 3'
+        try:
+            on_workspace_reload(layouts, state)(i3l, WorkspaceEvent({'change': 'reload'}, None))
+        finally:
+            self.server.config = 'set $i3l vstack to workspace 1'
+        assert layouts.get('1').name.value == 'hstack'
+        assert layouts.get('2').name.value == '2columns'
+        assert layouts.get('3').name.value == 'spiral'
+        assert any(command.endswith('mark --add i3l:1:main') for command in self.server.commands)
+
+    def test_restart_drops_container_ids_and_reloads_layouts(self):
+        i3l = self.server.connect()
+        layouts = Layouts.load(i3l.get_config())
+        state = State(i3l, RecordingWindowMapper())
+        windows = [self.tree.window_id(con_id) for con_id in self.tree.windows]
+        old_ids = list(self.tree.windows)
+        state.focus_history.focus(old_ids[0])
+        state.adjacency_graph(state.context)
+        on_tick(layouts, state)(i3l, TickEvent({'first': True, 'payload': ''}))
+        assert state.focus_history.current_id == old_ids[0]
+        on_shutdown(layouts, state)(i3l, ShutdownEvent({'change': 'restart'}))
+        self.tree.restart()
+        self.server.config = 'set $i3l hstack to workspace 1'
+        try:
+            on_tick(layouts, state)(i3l, TickEvent({'first': True, 'payload': ''}))
+        finally:
+            self.server.config = 'set $i3l vstack to workspace 1'
+        assert not state.restarting
+        assert layouts.get('1').name.value == 'hstack'
+        assert state.focus_history.current_id is None
+        assert state.workspace_sequences['1'].windows() == windows
+        assert state.workspace_sequences['1'].con_ids() == self.tree.windows
+        assert not any(state.workspace_sequences['1'].contains(con_id) for con_id in old_ids)
+        assert state.adjacency_graphs == {}
+
+
+if __name__ == '__main__':
+    unittest.main()